@@ -0,0 +1,37 @@
+"""Helpers shared by the benchmark scripts"""
+
+import importlib
+import json
+import sys
+import tempfile
+from pathlib import Path
+from types import ModuleType
+from typing import Optional
+
+from checkpoint.builders.docker import render_config
+from checkpoint.models.question import CheckpointQuestion
+
+ROOT = Path(__file__).resolve().parent.parent
+DATA_DIR = ROOT / "benchmarks" / "data"
+EXAMPLES_DIR = ROOT / "examples" / "questions"
+TEMPLATES_DIR = ROOT / "src" / "checkpoint" / "builders" / "templates"
+
+
+def load_recording(name: str) -> list[str]:
+    """Load the terminal output frames of a recorded session"""
+    return json.loads((DATA_DIR / f"{name}-session.json").read_text())
+
+
+def load_server(
+    question: str = "gdb-tutorial", config: Optional[CheckpointQuestion] = None
+) -> ModuleType:
+    """Import the container server with the config.py of an example question,
+    or of `config` when given"""
+    if config is None:
+        config = CheckpointQuestion.from_yaml(
+            EXAMPLES_DIR / question / "checkpoint.yaml"
+        )
+    config_dir = Path(tempfile.mkdtemp(prefix="checkpoint-bench-"))
+    (config_dir / "config.py").write_text(render_config(config))
+    sys.path[:0] = [str(config_dir), str(TEMPLATES_DIR)]
+    return importlib.import_module("server")
@@ -0,0 +1,100 @@
+"""CPU cost of terminal output handling for a high-output command (`cat` of a file)
+
+Feeds PTY-sized reads of a large text file through TermSocketWithLogging and
+compares the PTY-level tap with the previous path, which intercepted every
+frame after JSON serialization and parsed it again.
+
+Usage: python benchmarks/pty_output.py [--size-mb N]
+"""
+
+import argparse
+import json
+import time
+from typing import Any
+from unittest import mock
+
+from common import EXAMPLES_DIR, load_server
+from terminado.management import UniqueTermManager
+from tornado.httputil import HTTPServerRequest
+from tornado.ioloop import IOLoop
+from tornado.web import Application
+
+# Linux PTYs hand out at most one page per read
+READ_SIZE = 4095
+
+
+def make_output(size: int) -> list[str]:
+    """Split `size` bytes of C source into PTY reads, as `cat` would produce"""
+    source_dir = EXAMPLES_DIR / "gdb-tutorial" / "workspaceTemplates"
+    source = "".join(
+        path.read_text().replace("\n", "\r\n") for path in sorted(source_dir.glob("*"))
+    )
+    text = (source * (size // len(source) + 1))[:size]
+    return [text[i : i + READ_SIZE] for i in range(0, len(text), READ_SIZE)]
+
+
+def make_socket(cls: type) -> Any:
+    """Instantiate a terminal socket handler without a real connection"""
+    request = HTTPServerRequest(method="GET", uri="/terminals/main")
+    request.connection = mock.Mock()
+    term_manager = UniqueTermManager(shell_command=["true"])
+    socket = cls(Application(), request, term_manager=term_manager)
+    # Pretend the student just ran `cat`, so the echo filter lets output through
+    socket._last_input = "t"
+    return socket
+
+
+def measure(socket: Any, frames: list[str]) -> float:
+    """Return the CPU seconds spent handling all frames, queued callbacks included"""
+
+    async def drain() -> None:
+        pass
+
+    start = time.process_time()
+    for frame in frames:
+        socket.on_pty_read(frame)
+    IOLoop.current().run_sync(drain)
+    socket._flush_output_buffer()
+    return time.process_time() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=32)
+    args = parser.parse_args()
+
+    server = load_server()
+
+    class Sink(server.TermSocketWithLogging):
+        """Counts what would be written to the browser"""
+
+        def write_message(self, message: Any, binary: bool = False) -> None:
+            self.bytes_sent = getattr(self, "bytes_sent", 0) + len(message)
+
+    class LegacySink(Sink):
+        """The previous pipeline: serialize first, then parse the frame again"""
+
+        def on_pty_read(self, text: str) -> None:
+            self.send_json_message(["stdout", text])
+
+        def write_message(self, message: Any, binary: bool = False) -> None:
+            data = json.loads(message)
+            if data[0] in ["stdout", "stderr"]:
+                self._process_output(data[1])
+            super().write_message(message, binary)
+
+    frames = make_output(args.size_mb * 1024 * 1024)
+    size_mb = sum(len(frame) for frame in frames) / 1e6
+
+    legacy = measure(make_socket(LegacySink), frames)
+    tapped = measure(make_socket(Sink), frames)
+
+    print(f"cat of {size_mb:.1f} MB in {len(frames)} PTY reads")
+    print(f"{'path':<16}{'CPU s':>8}{'MB/s':>10}")
+    print(f"{'json re-parse':<16}{legacy:>8.3f}{size_mb / legacy:>10.1f}")
+    print(f"{'pty tap':<16}{tapped:>8.3f}{size_mb / tapped:>10.1f}")
+    print(f"CPU saved: {(1 - tapped / legacy) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
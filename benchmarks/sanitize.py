@@ -0,0 +1,60 @@
+"""Throughput of the terminal output sanitizer on recorded gdb and git sessions
+
+Usage: python benchmarks/sanitize.py [--repeat N]
+"""
+
+import argparse
+import time
+from typing import Callable
+
+import regex
+from common import load_recording, load_server
+
+
+def legacy_clean(text: str, last_input: str = "x") -> bool:
+    """The original multi-pass cleanup from TermSocketWithLogging.write_message"""
+    clean_text = regex.sub(r"\x1b\[[0-9;]*[mK]", "", text)
+    clean_text = regex.sub(r"\x1b\[\?[0-9]+[hl]", "", clean_text)
+    clean_text = regex.sub(r"\r\n?", "\n", clean_text)
+    clean_text = clean_text.replace("\b", "")
+    return bool(
+        clean_text.strip()
+        and clean_text.strip() != last_input
+        and clean_text.strip() != ""
+        and not clean_text.strip().endswith(last_input)
+    )
+
+
+def measure(clean: Callable[[str], object], frames: list[str], repeat: int) -> float:
+    """Return the throughput of `clean` over all frames in MB/s"""
+    size = sum(len(frame.encode()) for frame in frames) * repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for frame in frames:
+            clean(frame)
+    return size / (time.perf_counter() - start) / 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    server = load_server()
+
+    print(f"{'session':<10}{'legacy MB/s':>14}{'sanitizer MB/s':>16}{'speedup':>10}")
+    for name in ("gdb", "git"):
+        frames = load_recording(name)
+        sanitizer = server.OutputSanitizer()
+
+        def clean(frame: str, sanitizer=sanitizer) -> bool:
+            stripped = sanitizer.feed(frame).strip()
+            return bool(stripped and stripped != "x" and not stripped.endswith("x"))
+
+        legacy = measure(legacy_clean, frames, args.repeat)
+        current = measure(clean, frames, args.repeat)
+        print(f"{name:<10}{legacy:>14.1f}{current:>16.1f}{current / legacy:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
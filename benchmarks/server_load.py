@@ -0,0 +1,494 @@
+"""Load and latency of the workspace server under simulated students
+
+Starts the server through its own main() in this process, against a throwaway
+workdir and a generated config.py, and drives simulated students over the
+/terminals/ and /missions websockets. Each student types a command per mission
+(one keystroke per message, as the browser sends them); the program answers
+with a flood of recorded gdb output followed by a line that completes the
+mission and carries the time it was written.
+
+With --shell-integration the program is a `flood` command run from bash with
+its shell integration, so commands are read from its prompt marks instead.
+
+Reports the time from connecting to the first prompt, the latency from that
+line being written to `mission_complete` arriving, output throughput,
+stdout frames per second, bytes on the wire (counted by a TCP proxy in front
+of the server), event-loop lag and RSS, and saves them as JSON. The sockets
+negotiate permessage-deflate and the server coalesces output frames unless
+--no-compression or --no-coalesce turn them off, for a before/after pair.
+
+Usage: python benchmarks/server_load.py [--students N] [--missions N]
+           [--flood-kb N] [--shell-integration] [--no-coalesce]
+           [--no-compression] [--output PATH] [--compare PATH]
+"""
+
+import argparse
+import asyncio
+import getpass
+import json
+import platform
+import resource
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+from uuid import uuid4
+
+import regex
+from common import EXAMPLES_DIR, ROOT, load_recording, load_server
+from tornado.ioloop import IOLoop
+from tornado.websocket import WebSocketClientConnection, websocket_connect
+
+from checkpoint.models.question import CheckpointQuestion
+
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+
+# The simulated program: `flood <bytes> <mission>` writes <bytes> of filler and
+# then the line that completes <mission>, stamped with the monotonic clock. Given
+# the command's arguments it runs just that command, as the `flood` executable
+PROGRAM = """\
+import sys, time
+filler = open(sys.argv[1]).read()
+
+def flood(size, mission):
+    while size > 0:
+        sys.stdout.write(filler[:size])
+        size -= len(filler)
+    done = f"bench mission {mission} done at {time.monotonic():.6f}"
+    sys.stdout.write(f"\\n{done}\\n")
+
+if len(sys.argv) == 4:
+    flood(int(sys.argv[2]), sys.argv[3])
+    sys.exit()
+sys.stdout.write("$ ")
+sys.stdout.flush()
+for line in sys.stdin:
+    words = line.split()
+    if len(words) == 3 and words[0] == "flood":
+        flood(int(words[1]), words[2])
+    sys.stdout.write("$ ")
+    sys.stdout.flush()
+"""
+DONE_LINE = regex.compile(r"bench mission (\d+) done at (\d+\.\d+)\r?\n")
+# End of a prompt, of the simulated program or of bash, with its shell
+# integration mark
+PROMPT = regex.compile(r"[$#] (?:\x1b\]133;B\x07)?$")
+
+
+def make_config(workdir: Path, args: argparse.Namespace) -> CheckpointQuestion:
+    """A question whose missions are completed by the simulated program.
+
+    The workdir also gets the gdb tutorial's sources, so setup commands such
+    as its gcc build can be timed.
+    """
+    sources = EXAMPLES_DIR / "gdb-tutorial" / "workspaceTemplates"
+    shutil.copytree(sources, workdir, dirs_exist_ok=True)
+    (workdir / "program.py").write_text(PROGRAM)
+    (workdir / "filler.txt").write_text("".join(load_recording("gdb")))
+    runtime = {
+        "program": sys.executable,
+        "program_args": ["-u", "program.py", "filler.txt"],
+        "setup_commands": args.setup_command,
+        "terminal_pool_size": args.pool_size,
+    }
+    if args.shell_integration:
+        flood = workdir / "flood"
+        flood.write_text(
+            f'#!/bin/sh\nexec {sys.executable} -u "$(dirname "$0")/program.py" '
+            f'"$(dirname "$0")/filler.txt" "$@"\n'
+        )
+        flood.chmod(0o755)
+        runtime.update(
+            program="bash",
+            program_args=[],
+            setup_commands=[*args.setup_command, 'export PATH="$PWD:$PATH"'],
+            shell_integration=True,
+        )
+    return CheckpointQuestion.model_validate(
+        {
+            "uuid": str(uuid4()),
+            "title": "Server load benchmark",
+            "topic": "Benchmarks",
+            "image": {"registry": "local", "name": "bench"},
+            "runtime": runtime,
+            "flags": [
+                {
+                    "title": f"Mission {n}",
+                    "prompt": f"Mission {n}",
+                    "description": f"Run `flood <bytes> {n}`",
+                    "listener": {
+                        "target": "output",
+                        "type": "regex",
+                        "match": rf"bench mission {n} done at",
+                    },
+                }
+                for n in range(1, args.missions + 1)
+            ],
+        }
+    )
+
+
+def percentiles(values: list[float]) -> dict[str, Optional[float]]:
+    """p50, p99 and max by nearest rank, in milliseconds"""
+    if not values:
+        return {"p50": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        index = min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))
+        return round(ordered[index] * 1000, 3)
+
+    return {"p50": rank(0.50), "p99": rank(0.99), "max": rank(1.0)}
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process"""
+    pages = int(Path("/proc/self/statm").read_text().split()[1])
+    return pages * resource.getpagesize() / 2**20
+
+
+class WireCounter:
+    """A TCP proxy in front of the server that counts the bytes it forwards"""
+
+    def __init__(self, server_port: int) -> None:
+        self.server_port = server_port
+        self.to_client = 0
+        self.to_server = 0
+
+    async def start(self) -> int:
+        """Start listening, returning the port clients should connect to"""
+        proxy = await asyncio.start_server(self._connect, "127.0.0.1", 0)
+        return proxy.sockets[0].getsockname()[1]
+
+    async def _connect(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        upstream = await asyncio.open_connection("127.0.0.1", self.server_port)
+        await asyncio.gather(
+            self._pipe(reader, upstream[1], "to_server"),
+            self._pipe(upstream[0], writer, "to_client"),
+        )
+
+    async def _pipe(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, counter: str
+    ) -> None:
+        try:
+            while data := await reader.read(64 * 1024):
+                setattr(self, counter, getattr(self, counter) + len(data))
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+class Student:
+    """One browser page: a terminal socket and a mission socket of one session"""
+
+    def __init__(self, port: int, args: argparse.Namespace) -> None:
+        self.port = port
+        self.args = args
+        self.session_id = uuid4().hex
+        self.output_bytes = 0
+        self.frames = 0  # stdout frames received
+        self.output_seconds = 0.0  # Spent waiting between Enter and completion
+        self.first_prompt: Optional[float] = None  # Seconds after connecting
+        self.produced: dict[int, float] = {}
+        self.completed: dict[int, float] = {}
+        self._tail = ""
+        self._prompt = asyncio.Event()
+        self._mission_done: dict[int, asyncio.Event] = {}
+
+    async def run(self) -> None:
+        base = f"ws://127.0.0.1:{self.port}"
+        query = f"?session={self.session_id}"
+        # Offer permessage-deflate, as browsers do
+        compression = None if self.args.no_compression else {}
+        missions = await websocket_connect(
+            f"{base}/missions{query}", compression_options=compression
+        )
+        connected = time.monotonic()
+        terminal = await websocket_connect(
+            f"{base}/terminals/main{query}", compression_options=compression
+        )
+        readers = [
+            asyncio.ensure_future(self._read_terminal(terminal)),
+            asyncio.ensure_future(self._read_missions(missions)),
+        ]
+        try:
+            await asyncio.wait_for(self._prompt.wait(), self.args.timeout)
+            self.first_prompt = time.monotonic() - connected
+            for mission in range(1, self.args.missions + 1):
+                done = self._mission_done.setdefault(mission, asyncio.Event())
+                command = f"flood {self.args.flood_kb * 1024} {mission}"
+                for key in command:
+                    await terminal.write_message(json.dumps(["stdin", key]))
+                    await asyncio.sleep(self.args.keystroke_delay)
+                entered = time.monotonic()
+                await terminal.write_message(json.dumps(["stdin", "\r"]))
+                await asyncio.wait_for(done.wait(), self.args.timeout)
+                self.output_seconds += time.monotonic() - entered
+        finally:
+            terminal.close()
+            missions.close()
+            await asyncio.gather(*readers, return_exceptions=True)
+
+    async def _read_terminal(self, socket: WebSocketClientConnection) -> None:
+        while (message := await socket.read_message()) is not None:
+            kind, *content = json.loads(message)
+            if kind != "stdout":
+                continue
+            text = content[0]
+            self.output_bytes += len(text.encode())
+            self.frames += 1
+            self._tail = (self._tail + text)[-4096:]
+            if PROMPT.search(self._tail):
+                self._prompt.set()
+            for m in DONE_LINE.finditer(self._tail):
+                self.produced.setdefault(int(m.group(1)), float(m.group(2)))
+
+    async def _read_missions(self, socket: WebSocketClientConnection) -> None:
+        while (message := await socket.read_message()) is not None:
+            data = json.loads(message)
+            if data["type"] == "mission_complete":
+                mission = data["mission"] + 1
+                self.completed[mission] = time.monotonic()
+                self._mission_done.setdefault(mission, asyncio.Event()).set()
+
+    def latencies(self) -> list[float]:
+        return [
+            self.completed[mission] - produced
+            for mission, produced in self.produced.items()
+            if mission in self.completed
+        ]
+
+
+async def measure_loop_lag(lags: list[float], interval: float) -> None:
+    """Record how late the event loop wakes up a sleeper, until cancelled"""
+    while True:
+        start = time.monotonic()
+        await asyncio.sleep(interval)
+        lags.append(time.monotonic() - start - interval)
+
+
+async def drive(port: int, args: argparse.Namespace) -> dict[str, Any]:
+    """Run all students against the server and collect the measurements"""
+    wire = WireCounter(port)
+    proxy_port = await wire.start()
+    lags: list[float] = []
+    lag_task = asyncio.ensure_future(measure_loop_lag(lags, 0.01))
+    students = [Student(proxy_port, args) for _ in range(args.students)]
+    rss_start = rss_mb()
+
+    start = time.monotonic()
+    outcomes = await asyncio.gather(
+        *(student.run() for student in students), return_exceptions=True
+    )
+    duration = time.monotonic() - start
+    lag_task.cancel()
+
+    errors = [repr(e) for e in outcomes if isinstance(e, BaseException)]
+    output_bytes = sum(student.output_bytes for student in students)
+    frames = sum(student.frames for student in students)
+    output_seconds = sum(student.output_seconds for student in students) / len(students)
+    return {
+        "students": args.students,
+        "missions_expected": args.students * args.missions,
+        "missions_completed": sum(len(student.completed) for student in students),
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "first_prompt_ms": percentiles(
+            [s.first_prompt for s in students if s.first_prompt is not None]
+        ),
+        "latency_ms": percentiles(
+            [latency for student in students for latency in student.latencies()]
+        ),
+        "output_bytes": output_bytes,
+        "frames": frames,
+        "frames_per_s": round(frames / duration, 1),
+        "wire_bytes": {"to_client": wire.to_client, "to_server": wire.to_server},
+        # While output is flowing, i.e. without the time spent typing
+        "throughput_mb_s": round(output_bytes / output_seconds / 1e6, 3)
+        if output_seconds
+        else None,
+        "loop_lag_ms": percentiles(lags),
+        "rss_mb": {
+            "start": round(rss_start, 1),
+            "end": round(rss_mb(), 1),
+            # ru_maxrss is in KiB on Linux
+            "peak": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def run_server(args: argparse.Namespace) -> dict[str, Any]:
+    """Start the server via main() and stop it once the students are done"""
+    workdir = Path(tempfile.mkdtemp(prefix="checkpoint-load-"))
+    server = load_server(config=make_config(workdir, args))
+
+    class DirectTermManager(server.PooledTermManager):
+        """Runs the shell command as the current user; `su -l` needs root"""
+
+        def __init__(self, shell_command: list[str], **kwargs: Any) -> None:
+            super().__init__(shell_command=["sh", "-c", shell_command[-1]], **kwargs)
+
+    server.PooledTermManager = DirectTermManager
+    if args.no_coalesce:
+        server.TermSocketWithLogging.FRAME_DELAY = 0
+
+    port = free_port()
+    results: dict[str, Any] = {}
+
+    async def run() -> None:
+        try:
+            # Give the server time to fill its terminal pool, as students
+            # rarely connect the moment the workspace starts
+            await asyncio.sleep(args.warmup)
+            results.update(await drive(port, args))
+        finally:
+            # Let the server handle the closed sockets before stopping
+            await asyncio.sleep(0.5)
+            IOLoop.current().stop()
+
+    IOLoop.current().add_callback(run)
+    sys.argv = [
+        "server.py",
+        "--port",
+        str(port),
+        "--user",
+        getpass.getuser(),
+        "--workdir",
+        str(workdir),
+    ]
+    server.main()
+    return results
+
+
+def print_results(results: dict[str, Any], baseline: Optional[dict[str, Any]]) -> None:
+    rows = [
+        ("missions completed", ["missions_completed"], ""),
+        ("first prompt p50", ["first_prompt_ms", "p50"], "ms"),
+        ("first prompt p99", ["first_prompt_ms", "p99"], "ms"),
+        ("latency p50", ["latency_ms", "p50"], "ms"),
+        ("latency p99", ["latency_ms", "p99"], "ms"),
+        ("throughput", ["throughput_mb_s"], "MB/s"),
+        ("stdout frames", ["frames"], ""),
+        ("frames per second", ["frames_per_s"], ""),
+        ("wire to client", ["wire_bytes", "to_client"], "B"),
+        ("wire to server", ["wire_bytes", "to_server"], "B"),
+        ("loop lag p50", ["loop_lag_ms", "p50"], "ms"),
+        ("loop lag p99", ["loop_lag_ms", "p99"], "ms"),
+        ("loop lag max", ["loop_lag_ms", "max"], "ms"),
+        ("RSS peak", ["rss_mb", "peak"], "MB"),
+    ]
+
+    def get(data: dict[str, Any], keys: list[str]) -> Any:
+        for key in keys:
+            data = data.get(key) if isinstance(data, dict) else None  # type: ignore
+        return data
+
+    header = f"{'metric':<20}{'value':>12}"
+    if baseline is not None:
+        header += f"{'baseline':>12}{'change':>10}"
+    print(header)
+    for label, keys, unit in rows:
+        value = get(results, keys)
+        line = f"{label:<20}{f'{value} {unit}':>12}"
+        if baseline is not None:
+            old = get(baseline, keys)
+            change = ""
+            numbers = isinstance(value, (int, float)) and isinstance(old, (int, float))
+            if numbers and old:
+                change = f"{(value - old) / old * 100:+.1f}%"
+            line += f"{f'{old} {unit}':>12}{change:>10}"
+        print(line)
+    for error in results["errors"]:
+        print(f"error: {error}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=10)
+    parser.add_argument("--missions", type=int, default=5)
+    parser.add_argument("--flood-kb", type=int, default=256)
+    parser.add_argument("--keystroke-delay", type=float, default=0.005)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument(
+        "--setup-command",
+        action="append",
+        default=[],
+        help="Run before the program in every new terminal, like setup_commands",
+    )
+    parser.add_argument(
+        "--pool-size", type=int, default=0, help="Terminals started ahead of time"
+    )
+    parser.add_argument(
+        "--warmup", type=float, default=0.0, help="Seconds before students connect"
+    )
+    parser.add_argument(
+        "--no-coalesce",
+        action="store_true",
+        help="Send every PTY read as its own frame",
+    )
+    parser.add_argument(
+        "--no-compression",
+        action="store_true",
+        help="Do not offer permessage-deflate",
+    )
+    parser.add_argument(
+        "--shell-integration",
+        action="store_true",
+        help="Run `flood` from bash with shell integration",
+    )
+    parser.add_argument("--output", type=Path, help="Where to save the JSON results")
+    parser.add_argument("--compare", type=Path, help="Earlier JSON results")
+    args = parser.parse_args()
+
+    params = {
+        "students": args.students,
+        "missions": args.missions,
+        "flood_kb": args.flood_kb,
+        "keystroke_delay": args.keystroke_delay,
+        "setup_commands": args.setup_command,
+        "pool_size": args.pool_size,
+        "warmup": args.warmup,
+        "shell_integration": args.shell_integration,
+        "coalesce": not args.no_coalesce,
+        "compression": not args.no_compression,
+    }
+    print(
+        f"{args.students} students x {args.missions} missions, "
+        f"{args.flood_kb} KiB of output per mission"
+    )
+    results = {
+        "benchmark": "server_load",
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "params": params,
+        **run_server(args),
+    }
+
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    print_results(results, baseline)
+
+    output = args.output or RESULTS_DIR / (
+        f"server_load-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2) + "\n")
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
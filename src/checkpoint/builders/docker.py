@@ -1,18 +1,53 @@
+import hashlib
+import io
 import json
-import shutil
+import os
+import re
 import subprocess
-import tempfile
+import tarfile
+import threading
+import time
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any, Callable, Optional
 
 import docker
+import docker.errors
 import jinja2
+from docker.utils import parse_repository_tag
+from pydantic import BaseModel
 
-from checkpoint.constants import RUNTIME_DIR
+from checkpoint.constants import (
+    BUILD_MANIFEST_PATH,
+    PREBUILT_WORKSPACE_DIR,
+    RUNTIME_DIR,
+    WORKSPACE_TEMPLATES_PATH,
+)
 
 from ..models.question import CheckpointQuestion
 
+TEMPLATES_DIR = Path(__file__).parent / "templates"
+# Server files installed in the runtime image, next to where config.py goes
+APP_FILES = [
+    "index.html",
+    "server.py",
+    "missions.py",
+    "watch.py",
+    "shell-integration.bash",
+    "shell-integration-gdb.py",
+]
+
+# Build context entries: archive name -> (content, file mode); names ending
+# with "/" are directories
+BuildContext = dict[str, tuple[bytes, int]]
+
 
 def check_docker_auth(username: str) -> bool:
+    # A registry host such as localhost:5000 (a local registry:2) rather than
+    # a Docker Hub account; the push reports it if credentials are missing
+    if "." in username or ":" in username or username == "localhost":
+        return True
+
     docker_config_path = Path.home() / ".docker" / "config.json"
 
     # Step 1: Get the `credsStore` value
@@ -35,90 +70,557 @@ def check_docker_auth(username: str) -> bool:
     return any("docker.io" in key and username in value for key, value in creds.items())
 
 
-def raw_regex(s: str) -> str:
-    escaped = s.replace('"', r"\"")
-    return f'r"{escaped}"'
+def render_config(config: CheckpointQuestion) -> str:
+    """Render the config.py module loaded by the container server"""
+    env = jinja2.Environment(
+        loader=jinja2.FileSystemLoader(TEMPLATES_DIR),
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
+    # Python literals: tojson would escape non-BMP characters to surrogate
+    # pairs, which Python reads as two lone surrogates
+    env.filters["pyrepr"] = repr
 
+    template = env.get_template("config.py.j2")
+    return template.render(
+        flags=config.flags,
+        program=config.runtime.program,
+        program_args=config.runtime.program_args,
+        setup_commands=config.runtime.setup_commands,
+        record_session=config.runtime.record_session,
+        shell_integration=config.runtime.shell_integration,
+        terminal_pool_size=config.runtime.terminal_pool_size,
+        terminal_pool_idle_timeout=config.runtime.terminal_pool_idle_timeout,
+    )
 
-class DockerBuilder:
-    def __init__(self, config: CheckpointQuestion):
-        self.config: CheckpointQuestion = config
-        self.client = docker.from_env()
 
-    def build(self, tag: str) -> str:
-        """Build Docker image for the checkpoint"""
-        with tempfile.TemporaryDirectory() as tmpdir:
-            build_dir = Path(tmpdir)
-            self._prepare_context(build_dir)
+class BuildManifest:
+    """Local record of the image built from each build context digest"""
+
+    # Builds of several questions may run in parallel threads
+    _lock = threading.Lock()
+
+    def __init__(self, path: Path = BUILD_MANIFEST_PATH) -> None:
+        self.path = path
+
+    def load(self) -> dict[str, Any]:
+        try:
+            return json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, digest: str) -> Optional[str]:
+        """Return the ID of the image last built from this context, if any"""
+        entry = self.load().get(digest)
+        return entry["image_id"] if entry else None
+
+    def record(self, digest: str, image_id: str, tag: str) -> None:
+        with self._lock:
+            manifest = self.load()
+            manifest[digest] = {
+                "image_id": image_id,
+                "tag": tag,
+                "built_at": datetime.now(timezone.utc).isoformat(),
+            }
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(manifest, indent=2))
+            os.replace(tmp_path, self.path)
+
+
+def context_digest(context: BuildContext) -> str:
+    """Deterministic SHA-256 over the names, modes and contents of a context"""
+    digest = hashlib.sha256()
+    for name in sorted(context):
+        data, mode = context[name]
+        digest.update(f"{name}\0{mode:o}\0{len(data)}\0".encode())
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def context_tar(context: BuildContext) -> io.BytesIO:
+    """Pack a build context into an in-memory tar with fixed metadata"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for name in sorted(context):
+            data, mode = context[name]
+            info = tarfile.TarInfo(name.rstrip("/"))
+            info.mode = mode
+            if name.endswith("/"):
+                info.type = tarfile.DIRTYPE
+                tar.addfile(info)
+            else:
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return buffer
+
+
+def _context_file(path: Path) -> tuple[bytes, int]:
+    # Only the executable bit is kept, so the digest does not depend on umask
+    mode = 0o755 if path.stat().st_mode & 0o111 else 0o644
+    return path.read_bytes(), mode
+
+
+def _render_dockerfile(template_name: str, **kwargs: Any) -> str:
+    template_path = Path(__file__).parent / template_name
+    return jinja2.Template(template_path.read_text()).render(**kwargs)
+
+
+class LayerPush(BaseModel):
+    id: str  # Short layer ID, as in the output of `docker push`
+    status: str  # 'pushed', 'exists' or 'mounted' (from another repository)
+    bytes: int  # Bytes sent for pushed layers, local layer size otherwise
+    seconds: float
+
 
-            image, _ = self.client.images.build(
-                path=str(build_dir),
-                tag=tag,
-                dockerfile=str(build_dir / "Dockerfile"),
+class PushReport(BaseModel):
+    tag: str
+    digest: Optional[str] = None  # Manifest digest in the registry
+    skipped: bool = False  # The registry already had exactly this image
+    seconds: float = 0.0
+    layers: list[LayerPush] = []
+
+    @property
+    def uploaded(self) -> list[LayerPush]:
+        return [layer for layer in self.layers if layer.status == "pushed"]
+
+    @property
+    def present(self) -> list[LayerPush]:
+        return [layer for layer in self.layers if layer.status != "pushed"]
+
+
+def remote_digest(client: Any, tag: str) -> Optional[str]:
+    """Manifest digest of the image in the registry, None if it is not there"""
+    try:
+        return client.images.get_registry_data(tag).id
+    except docker.errors.APIError:
+        return None
+
+
+def _layer_sizes(image: Any) -> dict[str, int]:
+    """Size of each layer of a local image, by short layer ID"""
+    diff_ids = image.attrs.get("RootFS", {}).get("Layers", [])
+    # History is newest first and also lists instructions without a layer
+    sizes = [layer["Size"] for layer in reversed(image.history()) if layer["Size"]]
+    if len(sizes) != len(diff_ids):
+        return {}
+    # `docker push` shortens layer IDs to 12 hex digits of the diff ID
+    return {diff_id.split(":")[-1][:12]: size for diff_id, size in zip(diff_ids, sizes)}
+
+
+# Final status of each layer in the push output
+_PUSH_DONE = {"Pushed": "pushed", "Layer already exists": "exists"}
+
+
+def push_image(client: Any, tag: str) -> PushReport:
+    """Push an image unless the registry already has it, raising on errors.
+
+    The push is skipped when the manifest digest in the registry is one the
+    local image was last pushed or pulled as.
+    """
+    start = time.perf_counter()
+    image = client.images.get(tag)
+    repository, _ = parse_repository_tag(tag)
+    digest = remote_digest(client, tag)
+    if digest and f"{repository}@{digest}" in image.attrs.get("RepoDigests", []):
+        return PushReport(
+            tag=tag, digest=digest, skipped=True, seconds=time.perf_counter() - start
+        )
+
+    sizes = _layer_sizes(image)
+    started: dict[str, float] = {}
+    sent: dict[str, int] = {}
+    layers: list[LayerPush] = []
+    for line in client.images.push(tag, stream=True, decode=True):
+        if "error" in line:
+            raise ValueError(f"Docker push of {tag} failed: {line['error']}")
+        if "aux" in line:
+            digest = line["aux"].get("Digest", digest)
+            continue
+        layer_id, status = line.get("id"), line.get("status", "")
+        if not layer_id:
+            continue
+        now = time.perf_counter()
+        if status == "Preparing":
+            started[layer_id] = now
+            continue
+        if layer_id not in started:
+            continue
+        if status == "Pushing":
+            total = line.get("progressDetail", {}).get("total")
+            if total:
+                sent[layer_id] = total
+            continue
+        if status.startswith("Mounted from"):
+            done = "mounted"
+        elif status in _PUSH_DONE:
+            done = _PUSH_DONE[status]
+        else:
+            continue  # Waiting
+        layers.append(
+            LayerPush(
+                id=layer_id,
+                status=done,
+                bytes=sent.get(layer_id, sizes.get(layer_id, 0)),
+                seconds=now - started[layer_id],
             )
-            if not image.id:
-                raise ValueError("Docker build failed: no image ID returned")
-            return image.id
-
-    def _prepare_context(self, build_dir: Path) -> None:
-        """Prepare Docker build context"""
-        self._copy_templates(build_dir)
-        self._generate_config(build_dir)
-        self._generate_dockerfile(build_dir)
-
-    def _copy_templates(self, build_dir: Path) -> None:
-        """Copy template files to build directory"""
-        pkg_dir = Path(__file__).parent
-        templates_dir = pkg_dir / "templates"
-
-        for item in ["index.html", "server.py", "requirements.txt"]:
-            shutil.copy2(templates_dir / item, build_dir / item)
-
-    def _generate_config(self, build_dir: Path) -> None:
-        """Generate config.py from assessment config"""
-        pkg_dir = Path(__file__).parent
-
-        env = jinja2.Environment(
-            loader=jinja2.FileSystemLoader(pkg_dir / "templates"),
-            trim_blocks=True,
-            lstrip_blocks=True,
         )
+    return PushReport(
+        tag=tag, digest=digest, seconds=time.perf_counter() - start, layers=layers
+    )
 
-        env.filters["raw_regex"] = raw_regex
 
-        template = env.get_template("config.py.j2")
-        config_content = template.render(
-            flags=self.config.flags,
-            program=self.config.runtime.program,
-            program_args=self.config.runtime.program_args,
-            setup_commands=self.config.runtime.setup_commands,
-        )
+class BuildStep(BaseModel):
+    number: int
+    instruction: str  # e.g. "RUN apt-get update && ..."
+    cached: bool = False  # The daemon reused the layer of an earlier build
+    seconds: float = 0.0
 
-        (build_dir / "config.py").write_text(config_content)
+    def summary(self) -> str:
+        marker = "cached" if self.cached else "ran"
+        instruction = " ".join(self.instruction.split())
+        if len(instruction) > 60:
+            instruction = instruction[:57] + "..."
+        return f"Step {self.number:>2} {marker:<6} {self.seconds:>7.1f}s  {instruction}"
 
-    def _generate_dockerfile(self, build_dir: Path) -> None:
-        """Generate Dockerfile content"""
-        pkg_dir = Path(__file__).parent
-        runtime_config = self.config.runtime
 
-        # Prepare package installation commands
-        package_commands = ["apt-get install -y python3 python3-pip"]
-        if runtime_config.packages:
-            packages = " ".join(runtime_config.packages)
-            package_commands.append(f"apt-get install -y {packages}")
+class BuildReport(BaseModel):
+    """Wall-clock time of each step of one image build"""
+
+    tag: str
+    digest: str  # Of the build context, see context_digest
+    image_id: str = ""
+    seconds: float = 0.0
+    steps: list[BuildStep] = []
+
+
+# Classic builder output: "Step 3/9 : RUN apt-get update"
+BUILD_STEP = re.compile(r"Step (\d+)/\d+ : (.*)")
+BUILT_IMAGE = re.compile(r"Successfully built ([0-9a-f]+)")
+
+
+def stream_build(
+    client: Any,
+    context: BuildContext,
+    tag: str,
+    progress: Optional[Callable[[str], None]] = None,
+) -> BuildReport:
+    """Build an image through the low-level API, timing each step.
+
+    Each line of build output is passed to `progress`, and so is the
+    summary of each step as it finishes.
+    """
+    report = BuildReport(tag=tag, digest=context_digest(context))
+    start = time.perf_counter()
+    step: Optional[BuildStep] = None
+    step_start = start
 
-        template = jinja2.Template((pkg_dir / "Dockerfile.j2").read_text())
-        dockerfile = template.render(
-            base_image=self.config.image.base,
-            package_commands=package_commands,
+    def finish_step(now: float) -> None:
+        assert step is not None
+        step.seconds = now - step_start
+        report.steps.append(step)
+        if progress:
+            progress(step.summary())
+
+    for chunk in client.api.build(
+        fileobj=context_tar(context),
+        custom_context=True,
+        tag=tag,
+        rm=True,
+        decode=True,
+    ):
+        if "error" in chunk:
+            raise ValueError(f"Docker build failed: {chunk['error'].strip()}")
+        if "aux" in chunk:
+            report.image_id = chunk["aux"].get("ID", report.image_id)
+            continue
+        for line in chunk.get("stream", "").splitlines():
+            line = line.rstrip()
+            if not line:
+                continue
+            match = BUILD_STEP.match(line)
+            if match:
+                now = time.perf_counter()
+                if step is not None:
+                    finish_step(now)
+                step = BuildStep(number=int(match[1]), instruction=match[2])
+                step_start = now
+            elif line.strip() == "---> Using cache" and step is not None:
+                step.cached = True
+            elif not report.image_id and BUILT_IMAGE.match(line):
+                report.image_id = BUILT_IMAGE.match(line)[1]  # type: ignore
+            if progress:
+                progress(line)
+    if step is not None:
+        finish_step(time.perf_counter())
+
+    report.seconds = time.perf_counter() - start
+    if not report.image_id:
+        raise ValueError("Docker build failed: no image ID returned")
+    return report
+
+
+class RuntimeImage:
+    """The checkpoint runtime (Python, the server and its packages) on a base image.
+
+    Every question with the same `image.base` builds on the same runtime
+    image, so registries and workspace hosts store its layers only once. The
+    tag is versioned by a digest of the runtime's build context, so a new
+    server version gets a new tag instead of replacing the old one.
+
+    One instance can be shared by the builders of several questions, in
+    which case it is only made available and pushed once.
+    """
+
+    def __init__(
+        self, registry: str, base: str, client: Any, slim: bool = False
+    ) -> None:
+        self.base = base
+        self.client = client
+        self.slim = slim
+        self._lock = threading.Lock()
+        self._source: Optional[str] = None
+        self._pushed = False
+        # Set when the runtime image had to be built here
+        self.build_report: Optional[BuildReport] = None
+        self.context = self.build_context()
+        # Image tags allow [A-Za-z0-9_.-] and at most 128 characters
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "-", base).strip("-.")[:95]
+        if slim:
+            slug += "-slim"
+        self.tag = (
+            f"{registry}/checkpoint-runtime:{slug}-{context_digest(self.context)[:12]}"
+        )
+
+    def build_context(self) -> BuildContext:
+        context: BuildContext = {
+            name: _context_file(TEMPLATES_DIR / name)
+            for name in [*APP_FILES, "requirements.txt"]
+        }
+        dockerfile = _render_dockerfile(
+            "Dockerfile.runtime.j2",
+            base_image=self.base,
+            slim=self.slim,
             runtime_dir=RUNTIME_DIR.as_posix(),
+            app_files=APP_FILES,
+        )
+        context["Dockerfile"] = (dockerfile.encode(), 0o644)
+        return context
+
+    def ensure(self, progress: Optional[Callable[[str], None]] = None) -> str:
+        """Make the runtime image available locally: present, pulled or built.
+
+        Returns how it was obtained: 'present', 'pulled' or 'built'.
+        """
+        with self._lock:
+            if self._source is None:
+                self._source = self._ensure(progress)
+            return self._source
+
+    def _ensure(self, progress: Optional[Callable[[str], None]]) -> str:
+        try:
+            self.client.images.get(self.tag)
+            return "present"
+        except docker.errors.ImageNotFound:
+            pass
+        repository, tag = parse_repository_tag(self.tag)
+        try:
+            self.client.images.pull(repository, tag=tag)
+            return "pulled"
+        except docker.errors.APIError:
+            pass
+        self.build_report = stream_build(self.client, self.context, self.tag, progress)
+        return "built"
+
+    def push(self) -> Optional[PushReport]:
+        """Push the runtime image, returning None if it was already pushed"""
+        with self._lock:
+            if self._pushed:
+                return None
+            report = push_image(self.client, self.tag)
+            self._pushed = True
+            return report
+
+
+class LayerReuse(BaseModel):
+    """How much of a question image comes from the shared runtime image"""
+
+    runtime_image: str
+    shared_layers: int
+    shared_bytes: int
+    own_layers: int
+    own_bytes: int
+
+
+class LayerSize(BaseModel):
+    instruction: str  # The Dockerfile instruction that created the layer
+    bytes: int
+
+
+class ImageSize(BaseModel):
+    """Size of an image, layer by layer, against the question's budget"""
+
+    tag: str
+    bytes: int
+    budget_bytes: Optional[int] = None
+    layers: list[LayerSize] = []  # Oldest first
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget_bytes is not None and self.bytes > self.budget_bytes
+
+
+def _layer_instruction(created_by: str) -> str:
+    """Dockerfile instruction from the CreatedBy of an image history entry"""
+    if "#(nop) " in created_by:
+        return created_by.split("#(nop) ", 1)[1].strip()
+    # RUN steps, possibly after the build args: "|1 ARG=x /bin/sh -c make"
+    if "/bin/sh -c " in created_by:
+        return "RUN " + created_by.split("/bin/sh -c ", 1)[1].strip()
+    return created_by.strip()
+
+
+class DockerBuilder:
+    def __init__(
+        self,
+        config: CheckpointQuestion,
+        base_dir: Path = Path("."),
+        runtime: Optional[RuntimeImage] = None,
+    ):
+        self.config: CheckpointQuestion = config
+        # Directory of the question's checkpoint.yaml
+        self.base_dir = base_dir
+        self.client = docker.from_env()
+        self.manifest = BuildManifest()
+        self.runtime = runtime or RuntimeImage(
+            config.image.registry, config.image.base, self.client, config.image.slim
+        )
+        # Whether the last build() reused an image instead of building, and
+        # how it got the runtime image ('present', 'pulled' or 'built')
+        self.reused = False
+        self.runtime_source = ""
+        # Step timings of the images the last build() built
+        self.build_reports: list[BuildReport] = []
+
+    def build(
+        self,
+        tag: str,
+        force: bool = False,
+        progress: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        """Build Docker image for the checkpoint.
+
+        The image last built from an identical build context is reused (and
+        tagged) instead, unless `force` is set. Build output and step
+        timings are passed to `progress` as they arrive.
+        """
+        self.runtime_source = self.runtime.ensure(progress)
+        self.build_reports = []
+        if self.runtime_source == "built" and self.runtime.build_report:
+            self.build_reports.append(self.runtime.build_report)
+        context = self.build_context()
+        digest = context_digest(context)
+        self.reused = False
+        if not force:
+            image_id = self._reuse_image(digest, tag)
+            if image_id:
+                self.reused = True
+                return image_id
+
+        report = stream_build(self.client, context, tag, progress)
+        self.build_reports.append(report)
+        self.manifest.record(digest, report.image_id, tag)
+        return report.image_id
+
+    def _reuse_image(self, digest: str, tag: str) -> Optional[str]:
+        """Return the image built from this context if it still exists locally"""
+        image_id = self.manifest.get(digest)
+        if not image_id:
+            return None
+        try:
+            image = self.client.images.get(image_id)
+        except docker.errors.ImageNotFound:
+            return None
+        if tag not in image.tags and f"{tag}:latest" not in image.tags:
+            repository, image_tag = parse_repository_tag(tag)
+            image.tag(repository, image_tag)
+        return image_id
+
+    def build_context(self) -> BuildContext:
+        """Collect the files of the Docker build context"""
+        context = self._workspace_context()
+        context["config.py"] = (render_config(self.config).encode(), 0o644)
+        context["Dockerfile"] = (self._render_dockerfile().encode(), 0o644)
+        return context
+
+    def _workspace_context(self) -> BuildContext:
+        """Workspace templates, for build_commands to run in"""
+        if not self.config.runtime.build_commands:
+            return {}
+        context: BuildContext = {"workspace/": (b"", 0o755)}
+        templates_dir = self.base_dir / WORKSPACE_TEMPLATES_PATH
+        if templates_dir.is_dir():
+            for path in sorted(templates_dir.rglob("*")):
+                if path.is_file():
+                    relative = path.relative_to(templates_dir).as_posix()
+                    context[f"workspace/{relative}"] = _context_file(path)
+        return context
+
+    def _render_dockerfile(self) -> str:
+        """Render the Dockerfile of the question, on top of the runtime image"""
+        runtime_config = self.config.runtime
+        return _render_dockerfile(
+            "Dockerfile.j2",
+            runtime_image=self.runtime.tag,
+            slim=self.config.image.slim,
+            packages=runtime_config.packages,
+            build_commands=runtime_config.build_commands,
+            prebuilt_workspace_dir=PREBUILT_WORKSPACE_DIR.as_posix(),
             user=runtime_config.user,
             port=self.config.workspace_port,
             workspace_home=self.config.workspace_home,
         )
 
-        (build_dir / "Dockerfile").write_text(dockerfile)
+    def layer_reuse(self, tag: str) -> LayerReuse:
+        """Split the layers of a built question image into shared and own"""
+        history = self.client.images.get(tag).history()
+        runtime_history = self.client.images.get(self.runtime.tag).history()
+        # History lists the newest layer first, so the runtime's come last
+        own = history[: len(history) - len(runtime_history)]
+        return LayerReuse(
+            runtime_image=self.runtime.tag,
+            shared_layers=sum(1 for layer in runtime_history if layer["Size"]),
+            shared_bytes=sum(layer["Size"] for layer in runtime_history),
+            own_layers=sum(1 for layer in own if layer["Size"]),
+            own_bytes=sum(layer["Size"] for layer in own),
+        )
+
+    def image_size(self, tag: str) -> ImageSize:
+        """Break a built image down by layer and check it against the budget"""
+        image = self.client.images.get(tag)
+        budget_mb = self.config.image.size_budget_mb
+        return ImageSize(
+            tag=tag,
+            bytes=image.attrs["Size"],
+            budget_bytes=int(budget_mb * 1e6) if budget_mb else None,
+            layers=[
+                LayerSize(
+                    instruction=_layer_instruction(layer["CreatedBy"]),
+                    bytes=layer["Size"],
+                )
+                for layer in reversed(image.history())
+                if layer["Size"]
+            ],
+        )
+
+    def push(self, tag: str) -> list[PushReport]:
+        """Push Docker image to registry, with the runtime image it is built on.
 
-    def push(self, tag: str):
-        """Push Docker image to registry"""
-        self.client.images.push(tag)  # type: ignore
+        Images the registry already has are skipped. Returns a report for
+        each image checked, the runtime image's only the first time.
+        """
+        runtime_report = self.runtime.push()
+        reports = [runtime_report] if runtime_report else []
+        reports.append(push_image(self.client, tag))
+        return reports
@@ -11,21 +11,25 @@ PL_SERVER_PATH = Path("server.py")
 
 
 class QuestionBuilder:
-    def __init__(self, config: CheckpointQuestion):
+    def __init__(self, config: CheckpointQuestion, base_dir: Path = Path(".")):
         self.config = config
+        # Directory of the question's checkpoint.yaml, where the files go
+        self.base_dir = base_dir
         self.builder_dir = Path(__file__).parent
 
     def build(self, image_name: str):
         """Build PrairieLearn question files"""
         # 1. Create workspaceTemplates directory
-        WORKSPACE_TEMPLATES_PATH.mkdir(exist_ok=True)
+        (self.base_dir / WORKSPACE_TEMPLATES_PATH).mkdir(exist_ok=True)
 
         # 2. Generate question info.json
         info = self.config.generate_info_json(image_name)
-        QUESTION_INFO_PATH.write_text(json.dumps(info, indent=2))
+        (self.base_dir / QUESTION_INFO_PATH).write_text(json.dumps(info, indent=2))
 
         # 3. Copy PrairieLearn server.py
-        shutil.copy2(self.builder_dir / "pl_server.py.template", PL_SERVER_PATH)
+        shutil.copy2(
+            self.builder_dir / "pl_server.py.template", self.base_dir / PL_SERVER_PATH
+        )
 
         # 4. Generate question.html from template
         # We use string.Template instead of jinja2 here because the the generated
@@ -38,4 +42,4 @@ class QuestionBuilder:
             "following the instructions in the terminal below."
         )
         question_html = template.substitute(description=description)
-        QUESTION_HTML_PATH.write_text(question_html)
+        (self.base_dir / QUESTION_HTML_PATH).write_text(question_html)
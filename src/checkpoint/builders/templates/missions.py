@@ -0,0 +1,457 @@
+"""Mission listeners and progress tracking, shared by the server and the CLI.
+
+The container server imports this module next to server.py; the checkpoint
+CLI imports the same code to replay recorded sessions offline.
+"""
+
+import abc
+import hashlib
+import logging
+import posixpath
+import time
+from typing import Any, Optional
+
+import regex
+
+# Maximum amount of output (in characters) carried over between chunks while a
+# match is still pending, and the tail kept for anchors when nothing is pending
+STREAM_WINDOW = 64 * 1024
+STREAM_CONTEXT = 256
+
+# Default per-match time budget (seconds) of regex listeners and input cap
+# (characters, the stream window) of every listener, both overridable per
+# listener; matches slower than SLOW_MATCH seconds are logged
+MATCH_TIMEOUT = 0.05
+MAX_INPUT = STREAM_WINDOW
+SLOW_MATCH = 0.01
+
+server_logger = logging.getLogger("server")
+
+
+class StreamState:
+    """Incremental matching state of one mission over a stream of output chunks"""
+
+    __slots__ = ("carry", "found", "step")
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.carry = ""
+        self.found: set[int] = set()  # Literals of all_of listeners seen so far
+        self.step = 0  # Literals of a sequence listener seen so far, in order
+
+
+class ListenerMatcher(abc.ABC):
+    """Compiled form of a mission listener, built once at server startup"""
+
+    def __init__(self, listener: dict[str, Any]) -> None:
+        self.target: str = listener["target"]
+        self.type: str = listener["type"]
+        self.pattern: str = self.combine(listener["match"])
+        self.timeout: float = listener.get("timeout") or MATCH_TIMEOUT
+        self.max_input: int = listener.get("max_input") or MAX_INPUT
+        # Workspace-relative file of 'file' listeners
+        self.path: Optional[str] = listener.get("path")
+        self.mission: Optional[int] = None  # 1-based, set by compile_listeners
+        self.depends_on: list[int] = []  # 0-based, set by compile_listeners
+        self.timeouts = 0
+
+    def combine(self, match: Any) -> str:
+        """The pattern of the listener, from its `match` in config.py"""
+        if not isinstance(match, str):
+            raise ValueError(f"{self.type} listeners match a single string")
+        return match
+
+    @abc.abstractmethod
+    def match(self, content: str) -> bool:
+        """Whether a whole command, output or file content matches"""
+
+    def match_file(self, content: str) -> bool:
+        """Match the content of a file, read as bytes decoded with
+        surrogateescape; a file over `max_input` bytes never matches, rather
+        than being matched on a part of it"""
+        if len(content.encode("utf-8", "surrogateescape")) > self.max_input:
+            return False
+        return self.match(content)
+
+    def feed(self, state: StreamState, chunk: str) -> bool:
+        """Match against all output seen since the last reset, within the window"""
+        state.carry = (state.carry + chunk)[-self.max_input :]
+        if self.match(state.carry):
+            state.reset()
+            return True
+        return False
+
+
+class RegexMatcher(ListenerMatcher):
+    def __init__(self, listener: dict[str, Any]) -> None:
+        super().__init__(listener)
+        self.compiled = regex.compile(self.pattern, regex.DOTALL)
+
+    def search(self, text: str, partial: bool = False) -> Optional[regex.Match]:
+        """Search within the time budget, logging slow and timed-out matches.
+
+        Matching runs on the server's only thread, so a pattern that
+        backtracks badly must give up rather than freeze the terminal; a
+        timed-out search counts as no match.
+        """
+        start = time.perf_counter()
+        try:
+            m = self.compiled.search(text, partial=partial, timeout=self.timeout)
+        except TimeoutError:
+            self.timeouts += 1
+            server_logger.warning(
+                f"Mission {self.mission} listener {self.pattern!r} timed out "
+                f"after {self.timeout * 1000:.0f} ms on {len(text)} characters"
+            )
+            return None
+
+        elapsed = time.perf_counter() - start
+        if elapsed >= SLOW_MATCH:
+            server_logger.warning(
+                f"Slow match: mission {self.mission} listener {self.pattern!r} "
+                f"took {elapsed * 1000:.1f} ms on {len(text)} characters"
+            )
+        return m
+
+    def match(self, content: str) -> bool:
+        return self.search(content[-self.max_input :]) is not None
+
+    def feed(self, state: StreamState, chunk: str) -> bool:
+        """Match a chunk of output, carrying over only what can still match.
+
+        A partial match means the pattern ran into the end of the text, so the
+        text from its start is kept for the next chunk. Otherwise only a short
+        tail is kept so anchors and lookbehinds still see their context.
+        """
+        text = (state.carry + chunk)[-self.max_input :]
+        m = self.search(text, partial=True)
+        if m is not None and not m.partial:
+            state.reset()
+            return True
+
+        # After a timeout only the short tail is kept, so the same text is not
+        # searched again with every new chunk
+        keep_from = len(text) - STREAM_CONTEXT
+        if m is not None:
+            keep_from = min(keep_from, m.start())
+        state.carry = text[max(keep_from, 0) :]
+        return False
+
+
+class AnyOfMatcher(RegexMatcher):
+    """Any of several regexes, combined into one alternation searched once"""
+
+    def combine(self, match: Any) -> str:
+        patterns = _string_list(self.type, match)
+        # Compile each alternative alone first, so errors name the culprit
+        for pattern in patterns:
+            regex.compile(pattern, regex.DOTALL)
+        return "|".join(f"(?:{pattern})" for pattern in patterns)
+
+
+class ExactMatcher(ListenerMatcher):
+    def match(self, content: str) -> bool:
+        if len(content) > self.max_input:
+            return False
+        return content.strip() == self.pattern
+
+    def feed(self, state: StreamState, chunk: str) -> bool:
+        """Compare each chunk of output on its own, as it arrives; earlier
+        output since the command would never equal the pattern again"""
+        return self.match(chunk)
+
+
+class HashMatcher(ListenerMatcher):
+    """SHA-256 of a whole file, given as the file's bytes decoded with
+    surrogateescape so they round-trip exactly"""
+
+    def combine(self, match: Any) -> str:
+        digest = ListenerMatcher.combine(self, match).lower()
+        if not regex.fullmatch(r"[0-9a-f]{64}", digest):
+            raise ValueError("hash listeners match a SHA-256 hex digest")
+        return digest
+
+    def match(self, content: str) -> bool:
+        data = content.encode("utf-8", "surrogateescape")
+        return hashlib.sha256(data).hexdigest() == self.pattern
+
+
+class AllOfMatcher(ListenerMatcher):
+    """Literal strings that must all appear, in any order.
+
+    Each chunk of output costs one substring search per literal not seen
+    yet; literals already found are never searched for again. Only the last
+    len(longest literal) - 1 characters are carried over for literals split
+    across chunks.
+    """
+
+    def combine(self, match: Any) -> str:
+        self.literals = _string_list(self.type, match)
+        return " & ".join(self.literals)
+
+    def match(self, content: str) -> bool:
+        content = content[-self.max_input :]
+        return all(literal in content for literal in self.literals)
+
+    def feed(self, state: StreamState, chunk: str) -> bool:
+        text = state.carry + chunk
+        missing = [i for i in range(len(self.literals)) if i not in state.found]
+        state.found.update(i for i in missing if self.literals[i] in text)
+        if len(state.found) == len(self.literals):
+            state.reset()
+            return True
+        longest = max(len(self.literals[i]) for i in missing)
+        state.carry = text[max(len(text) - longest + 1, 0) :] if longest > 1 else ""
+        return False
+
+
+class ContainsMatcher(AllOfMatcher):
+    """A single literal string anywhere in the output or command"""
+
+    def combine(self, match: Any) -> str:
+        return super().combine([ListenerMatcher.combine(self, match)])
+
+
+class SequenceMatcher(ListenerMatcher):
+    """Literal strings that must appear in this order, without overlapping.
+
+    Only the next literal of the sequence is searched for, from the end of
+    the previous one: a chunk costs one substring search per literal it
+    completes, plus one for the literal still pending.
+    """
+
+    def combine(self, match: Any) -> str:
+        self.literals = _string_list(self.type, match)
+        return " ... ".join(self.literals)
+
+    def match(self, content: str) -> bool:
+        state = StreamState()
+        return self.feed(state, content[-self.max_input :])
+
+    def feed(self, state: StreamState, chunk: str) -> bool:
+        text = state.carry + chunk
+        position = 0
+        while state.step < len(self.literals):
+            literal = self.literals[state.step]
+            index = text.find(literal, position)
+            if index < 0:
+                break
+            position = index + len(literal)
+            state.step += 1
+        if state.step == len(self.literals):
+            state.reset()
+            return True
+        keep_from = len(text) - len(self.literals[state.step]) + 1
+        state.carry = text[max(position, keep_from) :]
+        return False
+
+
+def _string_list(listener_type: str, match: Any) -> list[str]:
+    if (
+        not isinstance(match, list)
+        or not match
+        or not all(isinstance(item, str) and item for item in match)
+    ):
+        raise ValueError(f"{listener_type} listeners match a list of non-empty strings")
+    return match
+
+
+LISTENER_MATCHERS: dict[str, type[ListenerMatcher]] = {
+    "regex": RegexMatcher,
+    "exact": ExactMatcher,
+    "contains": ContainsMatcher,
+    "all_of": AllOfMatcher,
+    "any_of": AnyOfMatcher,
+    "sequence": SequenceMatcher,
+    "hash": HashMatcher,
+}
+LISTENER_TARGETS = ("command", "output", "file")
+
+
+def workspace_path(path: Any) -> str:
+    """Normalize the path of a file listener, which must stay in the workdir"""
+    if not isinstance(path, str) or not path:
+        raise ValueError("file listeners need a path")
+    normalized = posixpath.normpath(path)
+    if posixpath.isabs(normalized) or normalized.split("/")[0] == "..":
+        raise ValueError(f"path {path!r} is not inside the workspace")
+    return normalized
+
+
+def resolve_dependencies(depends_on: list[Optional[list[int]]]) -> list[list[int]]:
+    """0-based prerequisites of each mission from their 1-based `depends_on`.
+
+    A mission without `depends_on` depends on the previous one, so questions
+    that never set it keep their missions in order. Raises ValueError on
+    unknown missions and on cycles.
+    """
+    resolved: list[list[int]] = []
+    count = len(depends_on)
+    for index, numbers in enumerate(depends_on):
+        if numbers is None:
+            resolved.append([index - 1] if index > 0 else [])
+            continue
+        for number in numbers:
+            if not 1 <= number <= count or number == index + 1:
+                raise ValueError(
+                    f"Mission {index + 1} depends on invalid mission {number}"
+                )
+        resolved.append(sorted({number - 1 for number in numbers}))
+
+    # Kahn's algorithm: whatever cannot be ordered is on a cycle
+    waiting = [len(prerequisites) for prerequisites in resolved]
+    ready = [index for index in range(count) if not waiting[index]]
+    dependents = _dependents(resolved)
+    for index in ready:
+        for dependent in dependents[index]:
+            waiting[dependent] -= 1
+            if not waiting[dependent]:
+                ready.append(dependent)
+    if len(ready) < count:
+        cycle = [index + 1 for index in range(count) if waiting[index]]
+        raise ValueError(f"Missions {cycle} depend on each other in a cycle")
+    return resolved
+
+
+def _dependents(prerequisites: list[list[int]]) -> list[list[int]]:
+    dependents: list[list[int]] = [[] for _ in prerequisites]
+    for index, required in enumerate(prerequisites):
+        for prerequisite in required:
+            dependents[prerequisite].append(index)
+    return dependents
+
+
+def compile_listeners(missions: list[dict[str, Any]]) -> list[ListenerMatcher]:
+    """Compile the listener of every mission, failing fast on invalid config"""
+    dependencies = resolve_dependencies(
+        [mission.get("depends_on") for mission in missions]
+    )
+    matchers: list[ListenerMatcher] = []
+    for index, mission in enumerate(missions, 1):
+        listener = mission["listener"]
+        start = time.perf_counter()
+        try:
+            if listener["target"] not in LISTENER_TARGETS:
+                raise ValueError(f"unknown target {listener['target']!r}")
+            if listener["type"] not in LISTENER_MATCHERS:
+                raise ValueError(f"unknown type {listener['type']!r}")
+            if listener["type"] == "hash" and listener["target"] != "file":
+                raise ValueError("hash listeners need the file target")
+            matcher = LISTENER_MATCHERS[listener["type"]](listener)
+            if matcher.target == "file":
+                matcher.path = workspace_path(matcher.path)
+            matcher.mission = index
+            matcher.depends_on = dependencies[index - 1]
+        except (KeyError, ValueError, regex.error) as e:
+            raise ValueError(
+                f"Invalid listener for mission {index} ({mission.get('title')!r}): {e}"
+            ) from e
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        server_logger.info(
+            f"Compiled mission {index} listener "
+            f"({matcher.type}/{matcher.target}) in {elapsed_ms:.3f} ms"
+        )
+        matchers.append(matcher)
+    return matchers
+
+
+class MissionTracker:
+    """Mission progress of one session, advanced by its terminal events.
+
+    A mission unlocks once every mission it depends on is complete. Each
+    event is only checked against the frontier: the unlocked, incomplete
+    missions listening to its target, indexed by target. The cost of an event
+    therefore follows the number of missions that can complete next, not the
+    size of the question. Each unlocked output mission keeps its own stream
+    state.
+    """
+
+    def __init__(self, listeners: list[ListenerMatcher]) -> None:
+        self.listeners = listeners
+        self.completed: list[int] = []  # 0-based, in the order completed
+        self.frontier: dict[str, list[int]] = {
+            target: [] for target in LISTENER_TARGETS
+        }
+        self.output_states: dict[int, StreamState] = {}
+        self._dependents = _dependents([m.depends_on for m in listeners])
+        self._waiting = [len(m.depends_on) for m in listeners]
+        for index, waiting in enumerate(self._waiting):
+            if not waiting:
+                self._unlock(index)
+
+    @property
+    def current_mission(self) -> int:
+        """Number of missions completed, the next one's index when in order"""
+        return len(self.completed)
+
+    @property
+    def unlocked(self) -> list[int]:
+        return sorted(
+            index for missions in self.frontier.values() for index in missions
+        )
+
+    def unlocked_by(self, index: int) -> list[int]:
+        """Missions that completing `index` unlocked, right after it completed"""
+        return [d for d in self._dependents[index] if not self._waiting[d]]
+
+    def check(
+        self, message_type: str, content: str, path: Optional[str] = None
+    ) -> list[int]:
+        """Check an event ('command', 'output' or 'file') against the frontier.
+
+        File events carry the content of the file at `path`, and are only
+        checked against the listeners of that file. Returns the missions the
+        event completed (0-based), empty if none; missions they unlock only
+        see later events.
+        """
+        # A new command starts a new stretch of output to match against
+        if message_type == "command":
+            for state in self.output_states.values():
+                state.reset()
+
+        candidates = self.frontier.get(message_type)
+        if not candidates:
+            return []
+
+        completed = []
+        for index in candidates:
+            listener = self.listeners[index]
+            if message_type == "file" and listener.path != path:
+                continue
+            if message_type == "output":
+                is_completed = listener.feed(self.output_states[index], content)
+            elif message_type == "file":
+                is_completed = listener.match_file(content)
+            else:
+                is_completed = listener.match(content)
+            if is_completed:
+                completed.append(index)
+        for index in completed:
+            self._complete(index)
+        return completed
+
+    def complete(self, index: int) -> bool:
+        """Complete an unlocked mission without checking an event, e.g. when
+        its completion is known from elsewhere. Returns False, changing
+        nothing, if the mission is locked or already complete."""
+        if index not in self.frontier[self.listeners[index].target]:
+            return False
+        self._complete(index)
+        return True
+
+    def _unlock(self, index: int) -> None:
+        target = self.listeners[index].target
+        self.frontier[target].append(index)
+        if target == "output":
+            self.output_states[index] = StreamState()
+
+    def _complete(self, index: int) -> None:
+        self.frontier[self.listeners[index].target].remove(index)
+        self.output_states.pop(index, None)
+        self.completed.append(index)
+        for dependent in self._dependents[index]:
+            self._waiting[dependent] -= 1
+            if not self._waiting[dependent]:
+                self._unlock(dependent)
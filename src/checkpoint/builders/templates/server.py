@@ -1,24 +1,322 @@
 import argparse
+import gzip
 import json
 import logging
 import logging.handlers
 import os
+import pwd
+import queue
+import shutil
+import signal
 import stat
-import subprocess
 import sys
+import tempfile
 import time
 from asyncio import Future
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
 from types import TracebackType
 from typing import Any, Optional
 
 import regex
-from config import MISSIONS, PROGRAM_COMMAND, SETUP_COMMANDS  # type: ignore
-from terminado.management import UniqueTermManager
+from config import (  # type: ignore
+    MISSIONS,
+    PROGRAM_COMMAND,
+    RECORD_SESSION,
+    SETUP_COMMANDS,
+    SHELL_INTEGRATION,
+    TERMINAL_POOL_IDLE_TIMEOUT,
+    TERMINAL_POOL_SIZE,
+)
+from missions import ListenerMatcher, MissionTracker, compile_listeners
+from terminado.management import PtyWithClients, UniqueTermManager
 from terminado.websocket import TermSocket
-from tornado.ioloop import IOLoop
+from tornado.ioloop import IOLoop, PeriodicCallback
 from tornado.web import Application, StaticFileHandler
 from tornado.websocket import WebSocketHandler
+from watch import WorkspaceWatcher, wait_for_directory
+
+# Workspace as left by the question's build_commands at image build time
+PREBUILT_WORKSPACE_DIR = Path(__file__).parent / "prebuilt_workspace"
+# Seconds to wait for the workspace directory, and the most workspace entries
+# checked for ownership at startup
+WORKDIR_TIMEOUT = 10
+MAX_CHOWN_ENTRIES = 100_000
+# permessage-deflate settings of both websockets, which browsers offer;
+# terminal output compresses well even at zlib's fastest level
+WEBSOCKET_COMPRESSION: dict[str, Any] = {"compression_level": 1}
+# Integration script of each supported program, and the option that loads it
+SHELL_INTEGRATION_SCRIPTS = {
+    "bash": ("shell-integration.bash", "--rcfile"),
+    "gdb": ("shell-integration-gdb.py", "-x"),
+}
+
+
+class GradeWriter:
+    """Writes the grade file atomically from a background thread.
+
+    Updates submitted within `delay` seconds of each other are coalesced into a
+    single write of the latest data, so the IOLoop never blocks on disk I/O.
+    """
+
+    def __init__(self, path: Path, delay: float = 0.1) -> None:
+        self.path = path
+        self.delay = delay
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending: Optional[dict[str, Any]] = None
+        self._scheduled: Optional[object] = None
+
+    def submit(self, data: dict[str, Any]) -> None:
+        """Queue data to be written, replacing any write not yet started"""
+        self._pending = data
+        if self._scheduled is None:
+            self._scheduled = IOLoop.current().call_later(self.delay, self.flush)
+
+    def flush(self) -> None:
+        """Start writing the pending data now"""
+        if self._scheduled is not None:
+            IOLoop.current().remove_timeout(self._scheduled)
+            self._scheduled = None
+        if self._pending is not None:
+            data, self._pending = self._pending, None
+            self._executor.submit(self.write, data)
+
+    def close(self) -> None:
+        """Write any pending data and wait for all writes to finish"""
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+    def write(self, data: dict[str, Any]) -> None:
+        """Write, fsync and rename, so readers never see a partial file"""
+        try:
+            tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.getLogger("server").error(f"Error writing grade file: {e}")
+
+
+class CappedFileHandler(logging.FileHandler):
+    """File handler that keeps the first and the last records within `max_bytes`.
+
+    The first half of the budget holds the log from its start. Once that is
+    full, records go to a tail file rotated with one backup, each holding a
+    quarter of the budget, so the most recent records survive however much
+    was logged; only records rotated out of the backup are dropped, and
+    counted. On close the tail is appended to the log after a line saying
+    how much was dropped. If the process is killed first, the tail is left
+    next to the log as `<name>.tail.1` and `<name>.tail`.
+    """
+
+    def __init__(self, filename: Path, max_bytes: int) -> None:
+        super().__init__(filename)
+        self.head_bytes = max_bytes // 2
+        self.tail_bytes = max_bytes // 4
+        self.bytes_written = self.stream.tell()
+        self.dropped_bytes = 0
+        self.dropped_records = 0
+        self.tail_path = Path(f"{filename}.tail")
+        self.backup_path = Path(f"{filename}.tail.1")
+        self._tail: Optional[Any] = None  # Open tail file, once the head is full
+        # Bytes and records in the tail file and in its backup
+        self._tail_size = (0, 0)
+        self._backup_size = (0, 0)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            data = (self.format(record) + self.terminator).encode(errors="replace")
+            if self._tail is None and self.bytes_written + len(data) <= self.head_bytes:
+                self.stream.write(data.decode())
+                self.flush()
+                self.bytes_written += len(data)
+                return
+            if self._tail is None:
+                self.stream.write(
+                    f"[log size limit of {self.head_bytes} bytes reached, "
+                    "the latest records follow at the end]\n"
+                )
+                self.flush()
+                self._tail = open(self.tail_path, "wb")
+            elif self._tail_size[0] + len(data) > self.tail_bytes:
+                self._rotate()
+            self._tail.write(data)
+            self._tail.flush()
+            self._tail_size = (self._tail_size[0] + len(data), self._tail_size[1] + 1)
+        except Exception:
+            self.handleError(record)
+
+    def _rotate(self) -> None:
+        assert self._tail is not None
+        self._tail.close()
+        self.dropped_bytes += self._backup_size[0]
+        self.dropped_records += self._backup_size[1]
+        os.replace(self.tail_path, self.backup_path)
+        self._backup_size, self._tail_size = self._tail_size, (0, 0)
+        self._tail = open(self.tail_path, "wb")
+
+    def close(self) -> None:
+        """Append the tail to the log, then close it"""
+        self.acquire()
+        try:
+            if self._tail is not None and self.stream is not None:
+                self._tail.close()
+                self._tail = None
+                self.stream.write(
+                    f"[{self.dropped_records} records ({self.dropped_bytes} bytes) "
+                    "dropped]\n"
+                )
+                for path in (self.backup_path, self.tail_path):
+                    if path.exists():
+                        self.stream.write(path.read_bytes().decode(errors="replace"))
+                        path.unlink()
+                self.flush()
+        finally:
+            self.release()
+        super().close()
+
+
+class TruncatingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to a listener thread, truncating long messages first.
+
+    Truncation happens before a record is queued, so a flood of output never
+    piles up in memory; when the queue is full the record is dropped.
+    """
+
+    def __init__(self, log_queue: queue.Queue, max_record_chars: int) -> None:
+        super().__init__(log_queue)
+        self.max_record_chars = max_record_chars
+        self.truncated_chars = 0
+        self.dropped_records = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        excess = len(record.msg) - self.max_record_chars
+        if excess > 0:
+            self.truncated_chars += excess
+            record.msg = (
+                f"{record.msg[: self.max_record_chars]}"
+                f"... [truncated {excess} characters]"
+            )
+            record.message = record.msg
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped_records += 1
+
+
+class LogFile:
+    """A log file written by its own listener thread through a bounded queue"""
+
+    QUEUE_SIZE = 10000
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int,
+        max_record_chars: int,
+        formatter: logging.Formatter,
+    ) -> None:
+        self.path = path
+        self.file_handler = CappedFileHandler(path, max_bytes)
+        self.file_handler.setFormatter(formatter)
+        self.handler = TruncatingQueueHandler(
+            queue.Queue(self.QUEUE_SIZE), max_record_chars
+        )
+        self.listener = logging.handlers.QueueListener(
+            self.handler.queue, self.file_handler
+        )
+        self.listener.start()
+
+    def stats(self) -> dict[str, int]:
+        """Counters of what was written, truncated and dropped"""
+        return {
+            "bytes_written": self.file_handler.bytes_written,
+            "truncated_chars": self.handler.truncated_chars,
+            "dropped_bytes": self.file_handler.dropped_bytes,
+            "dropped_records": (
+                self.file_handler.dropped_records + self.handler.dropped_records
+            ),
+        }
+
+    def close(self) -> None:
+        """Write all queued records and close the file"""
+        self.listener.stop()
+        self.file_handler.close()
+
+
+class SessionRecorder:
+    """Streams session events to a gzip-compressed JSONL file.
+
+    Each line is one event: ``{"t": seconds since start (monotonic), "kind":
+    "stdin" | "command" | "output" | "file" | "mission_complete", "mission":
+    index, "data": text}``, where the text of a file event is its path. Events
+    are encoded and written in batches by a background thread; every batch
+    ends with a sync flush, so the file can be read up to the last batch even
+    if the container is killed.
+    """
+
+    FLUSH_INTERVAL = 1.0
+    # Once this much event data is recorded only commands and completions are kept
+    MAX_BYTES = 32 * 1024 * 1024
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.bytes_recorded = 0
+        self.dropped_events = 0
+        self._start = time.monotonic()
+        self._events: list[tuple[float, str, int, Optional[str]]] = []
+        self._file = gzip.open(path, "wb")
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._flusher = PeriodicCallback(self.flush, self.FLUSH_INTERVAL * 1000)
+        self._flusher.start()
+
+    def record(self, kind: str, mission: int, data: Optional[str] = None) -> None:
+        """Queue an event for the next batch"""
+        if data is not None and kind in ("stdin", "output"):
+            if self.bytes_recorded >= self.MAX_BYTES:
+                self.dropped_events += 1
+                return
+            self.bytes_recorded += len(data)
+        self._events.append((time.monotonic() - self._start, kind, mission, data))
+
+    def flush(self) -> None:
+        """Hand the queued events to the writer thread"""
+        if self._events:
+            events, self._events = self._events, []
+            self._executor.submit(self._write, events)
+
+    def close(self) -> None:
+        """Write all queued events and close the file"""
+        self._flusher.stop()
+        self.flush()
+        self._executor.shutdown(wait=True)
+        self._file.close()
+
+    def _write(self, events: list[tuple[float, str, int, Optional[str]]]) -> None:
+        try:
+            lines = []
+            for t, kind, mission, data in events:
+                event: dict[str, Any] = {
+                    "t": round(t, 6),
+                    "kind": kind,
+                    "mission": mission,
+                }
+                if data is not None:
+                    event["data"] = data
+                lines.append(json.dumps(event, ensure_ascii=False))
+            lines.append("")
+            self._file.write("\n".join(lines).encode())
+            self._file.flush()
+        except Exception as e:
+            logging.getLogger("server").error(f"Error writing session recording: {e}")
 
 
 class GradeManager:
@@ -26,6 +324,16 @@ class GradeManager:
     GRADE_FILE: Path
     LOG_FILE: Path
     SERVER_LOG_FILE: Path
+    RECORDING_FILE: Path
+    # Unset if init failed before creating it
+    writer: Optional[GradeWriter] = None
+    recorder: Optional[SessionRecorder] = None
+    log_files: list[LogFile] = []
+
+    # Limits keeping both logs cheap to store and upload with the submission
+    MAX_LOG_BYTES = 8 * 1024 * 1024
+    MAX_SERVER_LOG_BYTES = 2 * 1024 * 1024
+    MAX_RECORD_CHARS = 16 * 1024
 
     @classmethod
     def set_workdir(cls, workdir: str) -> None:
@@ -34,12 +342,17 @@ class GradeManager:
         cls.GRADE_FILE = cls.GRADE_DIR / "results.json"
         cls.LOG_FILE = cls.GRADE_DIR / "session.log"
         cls.SERVER_LOG_FILE = cls.GRADE_DIR / "server.log"
+        cls.RECORDING_FILE = cls.GRADE_DIR / "session.jsonl.gz"
 
     @classmethod
     def _create_grade_data(
-        cls, completed_missions: int, total_missions: int
+        cls,
+        total_missions: int,
+        completed_at: Optional[dict[int, float]] = None,
     ) -> dict[str, Any]:
-        """Create grade data structure"""
+        """Create grade data structure from the completion time of each mission"""
+        timestamps = completed_at or {}
+        completed_missions = len(timestamps)
         score = completed_missions / total_missions if total_missions > 0 else 0
         return {
             "score": score,
@@ -47,11 +360,24 @@ class GradeManager:
             "feedback": {
                 "completed_missions": completed_missions,
                 "total_missions": total_missions,
+                # Mission numbers (1-based), as missions may complete out of order
+                "completed": sorted(index + 1 for index in timestamps),
                 "message": (
                     f"Completed {completed_missions} out of {total_missions} "
                     "missions"
                 ),
             },
+            "missions": [
+                {
+                    "title": mission["title"],
+                    "completed_at": (
+                        datetime.fromtimestamp(timestamps[i], timezone.utc).isoformat()
+                        if i in timestamps
+                        else None
+                    ),
+                }
+                for i, mission in enumerate(MISSIONS)
+            ],
         }
 
     @classmethod
@@ -64,9 +390,14 @@ class GradeManager:
         # Setup server logging
         cls.server_logger = logging.getLogger("server")
         cls.server_logger.setLevel(logging.INFO)
-        handler = logging.FileHandler(cls.SERVER_LOG_FILE)
-        handler.setFormatter(logging.Formatter(fmt="%(asctime)s - %(message)s"))
-        cls.server_logger.addHandler(handler)
+        server_log = LogFile(
+            cls.SERVER_LOG_FILE,
+            cls.MAX_SERVER_LOG_BYTES,
+            cls.MAX_RECORD_CHARS,
+            logging.Formatter(fmt="%(asctime)s - %(message)s"),
+        )
+        cls.server_logger.addHandler(server_log.handler)
+        cls.log_files.append(server_log)
 
         def handle_exception(
             exc_type: type[Exception],
@@ -83,18 +414,35 @@ class GradeManager:
 
         sys.excepthook = handle_exception
 
+        # Created first, so a failure below still leaves grade updates working
+        try:
+            cls.writer = GradeWriter(cls.GRADE_FILE)
+        except Exception as e:
+            cls.server_logger.error(f"Error creating grade writer: {e}")
+
         try:
             # Setup session logging
-            logging.basicConfig(
-                filename=cls.LOG_FILE,
-                level=logging.INFO,
-                format="%(asctime)s - %(message)s",
-                datefmt="%Y-%m-%d %H:%M:%S",
+            session_log = LogFile(
+                cls.LOG_FILE,
+                cls.MAX_LOG_BYTES,
+                cls.MAX_RECORD_CHARS,
+                logging.Formatter(
+                    fmt="%(asctime)s - %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
+                ),
             )
+            root_logger = logging.getLogger()
+            root_logger.setLevel(logging.INFO)
+            root_logger.addHandler(session_log.handler)
+            cls.log_files.append(session_log)
 
             # Initialize grade file
-            with open(cls.GRADE_FILE, "w") as f:
-                json.dump(cls._create_grade_data(0, len(MISSIONS)), f)
+            if cls.writer is not None:
+                cls.writer.write(cls._create_grade_data(len(MISSIONS)))
+
+            # Setup structured session recording
+            if RECORD_SESSION:
+                cls.recorder = SessionRecorder(cls.RECORDING_FILE)
+                cls.RECORDING_FILE.chmod(stat.S_IRUSR | stat.S_IWUSR)  # 600
 
             # Set permissions for files
             cls.GRADE_FILE.chmod(stat.S_IRUSR | stat.S_IWUSR)  # 600
@@ -107,35 +455,145 @@ class GradeManager:
             cls.server_logger.error(f"Error initializing grade file and logging: {e}")
 
     @classmethod
-    def update(cls, completed_missions: int) -> None:
-        """Update grade file"""
+    def update(cls, completed_at: dict[int, float]) -> None:
+        """Queue an update of the grade file"""
+        if cls.writer is None:
+            return
         try:
-            with open(cls.GRADE_FILE, "w") as f:
-                json.dump(cls._create_grade_data(completed_missions, len(MISSIONS)), f)
+            cls.writer.submit(cls._create_grade_data(len(MISSIONS), completed_at))
         except Exception as e:
             cls.server_logger.error(f"Error updating grade file: {e}")
 
+    @classmethod
+    def record(cls, kind: str, mission: int, data: Optional[str] = None) -> None:
+        """Record a session event if structured recording is enabled"""
+        if cls.recorder is not None:
+            cls.recorder.record(kind, mission, data)
+
+    @classmethod
+    def flush(cls) -> None:
+        """Start writing any pending grade update without waiting for coalescing"""
+        if cls.writer is not None:
+            cls.writer.flush()
+
+    @classmethod
+    def close(cls) -> None:
+        """Write any pending grade update and log records, then close the logs"""
+        if cls.writer is not None:
+            cls.writer.close()
+        if cls.recorder is not None:
+            cls.recorder.close()
+            cls.server_logger.info(
+                f"{cls.RECORDING_FILE.name} stats: "
+                f"{cls.recorder.bytes_recorded} characters recorded, "
+                f"{cls.recorder.dropped_events} events dropped"
+            )
+        for log_file in cls.log_files:
+            cls.server_logger.info(f"{log_file.path.name} stats: {log_file.stats()}")
+        for log_file in reversed(cls.log_files):
+            log_file.close()
+
 
 MISSIONS: list[dict[str, Any]]
 PROGRAM_COMMAND: list[str]
 SETUP_COMMANDS: list[str]
 
 
-class MissionHandler(WebSocketHandler):
-    active_connections: set["MissionHandler"] = set()
+class Session(MissionTracker):
+    """Links the terminal socket of one browser page to its mission socket(s).
 
+    Mission progress lives on the session, so terminal events are checked once
+    and only reach the mission sockets of the same page, as plain Python calls.
+    """
+
+    sessions: dict[str, "Session"] = {}
+    listeners: list[ListenerMatcher] = []
+    watcher: Optional[WorkspaceWatcher] = None
+
+    def __init__(self, session_id: str) -> None:
+        super().__init__(Session.listeners)
+        self.session_id = session_id
+        self.completed_at: dict[int, float] = {}  # By mission index
+        self.terminal: Optional[TermSocketWithLogging] = None
+        self.mission_handlers: list[MissionHandler] = []
+
+    @classmethod
+    def get(cls, session_id: str) -> "Session":
+        """Return the session with the given ID, creating it if needed"""
+        session = cls.sessions.get(session_id)
+        if session is None:
+            session = cls.sessions[session_id] = cls(session_id)
+        return session
+
+    def release(self) -> None:
+        """Forget the session once none of its sockets is connected"""
+        if self.terminal is None and not self.mission_handlers:
+            Session.sessions.pop(self.session_id, None)
+
+    def dispatch(self, message_type: str, content: str) -> None:
+        """Check a terminal event ('command' or 'output') against the missions"""
+        try:
+            GradeManager.record(message_type, self.current_mission, content)
+            for mission in self.check(message_type, content):
+                self._complete_mission(mission)
+        except Exception as e:
+            logging.error(f"Error checking mission: {e}")
+
+    @classmethod
+    def file_changed(cls, path: str, content: str) -> None:
+        """Check a changed workspace file against the missions of every session"""
+        GradeManager.server_logger.info(f"File changed: {path}")
+        for session in list(cls.sessions.values()):
+            session.check_file(path, content)
+
+    def check_file(self, path: str, content: str) -> None:
+        """Check the content of a workspace file against its file missions"""
+        try:
+            GradeManager.record("file", self.current_mission, path)
+            for mission in self.check("file", content, path):
+                self._complete_mission(mission)
+        except Exception as e:
+            logging.error(f"Error checking mission: {e}")
+
+    def _unlock(self, index: int) -> None:
+        super()._unlock(index)
+        # The file may already be as the mission wants it
+        listener = self.listeners[index]
+        if listener.target == "file" and Session.watcher is not None:
+            IOLoop.current().add_callback(self._check_current_file, listener.path)
+
+    def _check_current_file(self, path: str) -> None:
+        if Session.sessions.get(self.session_id) is not self:
+            return
+        assert Session.watcher is not None
+        content = Session.watcher.read(path)
+        if content is not None:
+            self.check_file(path, content)
+
+    def _complete_mission(self, mission: int) -> None:
+        self.completed_at[mission] = time.time()
+        GradeManager.record("mission_complete", mission)
+        GradeManager.update(self.completed_at)
+        unlocked = self.unlocked_by(mission)
+        for handler in self.mission_handlers:
+            handler.send_mission_complete(mission, unlocked)
+
+
+class MissionHandler(WebSocketHandler):
     def initialize(self):
-        self.current_mission = 0
+        self.session: Optional[Session] = None
 
     def check_origin(self, origin: str) -> bool:
         return True
 
     def open(self, *args: Any, **kwargs: Any) -> None:
-        MissionHandler.active_connections.add(self)
+        self.session = Session.get(self.get_argument("session", ""))
+        self.session.mission_handlers.append(self)
         self.write_message(
             {
                 "type": "init",
-                "currentMission": self.current_mission,
+                "completed": self.session.completed,
+                "unlocked": self.session.unlocked,
                 "missions": [
                     {
                         "title": m["title"],
@@ -146,167 +604,541 @@ class MissionHandler(WebSocketHandler):
                 ],
             }
         )
-        GradeManager.update(self.current_mission)
+        GradeManager.update(self.session.completed_at)
 
-    def on_message(self, message: str | bytes) -> Future[None]:
-        try:
-            if isinstance(message, bytes):
-                message = message.decode("utf-8")
+    def on_message(self, message: str | bytes) -> None:
+        """Mission sockets only push updates; events come through the session"""
 
-            data = json.loads(message)
-            content = data["content"]
-            message_type = data["type"]  # 'command' or 'output'
+    def get_compression_options(self) -> Optional[dict[str, Any]]:
+        return WEBSOCKET_COMPRESSION
 
-            return self._check_mission(content, message_type)
-        except Exception as e:
-            logging.error(f"Error handling message: {e}")
-            return Future()
+    def send_mission_complete(self, mission: int, unlocked: list[int]) -> Future[None]:
+        """Send what changed since the init message or the last update: the
+        mission completed and the missions that unlocked"""
+        return self.write_message(
+            {"type": "mission_complete", "mission": mission, "unlocked": unlocked}
+        )
 
-    def _check_mission(self, content: str, message_type: str) -> Future[None]:
-        if self.current_mission >= len(MISSIONS):
-            return Future()
+    def on_close(self) -> None:
+        if self.session is not None:
+            self.session.mission_handlers.remove(self)
+            self.session.release()
+        GradeManager.flush()
 
-        mission = MISSIONS[self.current_mission]
-        listener = mission["listener"]
 
-        # Skip if message type doesn't match the target
-        if listener["target"] != message_type:
-            return Future()
+# Terminal control sequences removed from output before it is logged or matched:
+# CSI (colors, cursor movement, modes), OSC (window titles, hyperlinks),
+# DCS/SOS/PM/APC strings, other ESC sequences, CR before LF and C0 controls
+# other than tab and newline
+CONTROL_SEQUENCE = regex.compile(
+    r"\x1b\[[0-?]*[ -/]*[@-~]"
+    r"|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)"
+    r"|\x1b[PX^_][^\x1b]*\x1b\\"
+    r"|\x1b[ -/]*[0-~]"
+    r"|\r(?=\n)"
+    r"|[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]"
+)
+# Prefix of a control sequence left unterminated at the end of a chunk
+INCOMPLETE_SEQUENCE = regex.compile(
+    r"\x1b(?:\[[0-?]*[ -/]*|\][^\x07\x1b]*|[PX^_][^\x1b]*|[ -/]*)"
+)
 
-        is_completed = False
-        if listener["type"] == "regex":
-            compiled_regex = regex.compile(listener["match"], regex.DOTALL)
-            is_completed = bool(compiled_regex.search(content))
-        elif listener["type"] == "exact":
-            is_completed = content.strip() == listener["match"]
 
-        if is_completed:
-            self.current_mission += 1
-            GradeManager.update(self.current_mission)
-            return self._send_mission_complete()
+class OutputSanitizer:
+    """Strips terminal control sequences from a stream of output chunks.
 
-        return Future()
+    Sequences (and a CR) split across two PTY reads are held back until the
+    next chunk completes them, so no fragments leak into the cleaned text.
+    """
 
-    def _send_mission_complete(self) -> Future[None]:
-        return self.write_message(
-            {
-                "type": "mission_complete",
-                "currentMission": self.current_mission,
-                "missions": MISSIONS,
-            }
-        )
+    MAX_PENDING = 4096
 
-    def on_close(self) -> None:
-        MissionHandler.active_connections.remove(self)
+    def __init__(self) -> None:
+        self._pending = ""
+
+    def feed(self, text: str) -> str:
+        if self._pending:
+            text = self._pending + text
+            self._pending = ""
+
+        cut = len(text)
+        if text.endswith("\r"):
+            cut -= 1
+        esc = text.rfind("\x1b", max(0, cut - self.MAX_PENDING))
+        if esc != -1 and INCOMPLETE_SEQUENCE.fullmatch(text, esc, cut):
+            cut = esc
+        if cut < len(text):
+            self._pending = text[cut:]
+            text = text[:cut]
+
+        text = CONTROL_SEQUENCE.sub("", text)
+        if "\r" in text:
+            text = text.replace("\r", "\n")
+        return text
+
+
+# OSC 133 mark written by a shell-integrated program, with its kind and data
+PROMPT_MARK = regex.compile(r"\x1b\]133;([A-E])(?:;([^\x07\x1b]*))?(?:\x07|\x1b\\)")
+
+
+class PromptMarkers:
+    """Splits the output of a shell-integrated program at its OSC 133 marks.
+
+    Between A and B is the prompt, and the command line typed after B is
+    echoed up to the first newline; both are dropped. The command line is
+    reported by C when it starts running (bash) or by E once it is done (gdb),
+    whose output is held until then. D ends the command. `feed` returns the
+    ('command', line) and ('output', text) events in order; text before the
+    first mark is output.
+
+    Only D and E release held output. A and B without them come from readline
+    redrawing the prompt, e.g. after listing completions, and drop what was
+    held: the listing and the line typed so far, which no command printed.
+    """
+
+    MAX_HELD = 1024 * 1024
+
+    def __init__(self) -> None:
+        self.state = "output"  # 'prompt', 'echo', 'held' or 'output'
+        self._pending = ""
+        self._held: list[str] = []
+        self._held_chars = 0
+
+    def feed(self, text: str) -> list[tuple[str, str]]:
+        if self._pending:
+            text = self._pending + text
+            self._pending = ""
+
+        # Hold back a mark split across two PTY reads
+        esc = text.rfind("\x1b", max(0, len(text) - 4096))
+        if esc != -1:
+            m = PROMPT_MARK.fullmatch(text, esc, partial=True)
+            if m is not None and m.partial:
+                self._pending = text[esc:]
+                text = text[:esc]
+
+        events: list[tuple[str, str]] = []
+        start = 0
+        for m in PROMPT_MARK.finditer(text):
+            self._text(text[start : m.start()], events)
+            self._mark(m.group(1), m.group(2) or "", events)
+            start = m.end()
+        self._text(text[start:], events)
+        return events
+
+    def _text(self, text: str, events: list[tuple[str, str]]) -> None:
+        if self.state == "echo":
+            newline = text.find("\n")
+            if newline == -1:
+                return
+            text = text[newline + 1 :]
+            self.state = "held"
+        if not text:
+            return
+        if self.state == "output":
+            events.append(("output", text))
+        elif self.state == "held":
+            self._held.append(text)
+            self._held_chars += len(text)
+            if self._held_chars > self.MAX_HELD:
+                # Missions only match the end of long output anyway
+                held = "".join(self._held)[-self.MAX_HELD :]
+                self._held, self._held_chars = [held], len(held)
+
+    def _mark(self, kind: str, data: str, events: list[tuple[str, str]]) -> None:
+        if kind in "CE" and data.strip():
+            events.append(("command", data.strip()))
+        if kind in "DE" and self._held:
+            events.append(("output", "".join(self._held)))
+        # After C only the shell's own cleanup was held since the echo
+        self._held, self._held_chars = [], 0
+        self.state = {"B": "echo", "C": "output"}.get(kind, "prompt")
 
 
 class TermSocketWithLogging(TermSocket):
+    # Set by main() once the program's shell integration script is installed
+    shell_integration = False
+    # PTY reads within FRAME_DELAY seconds of the last stdout frame are sent
+    # together, in frames of up to FRAME_MAX_CHARS; 0 sends every read as is
+    FRAME_DELAY = 0.005
+    FRAME_MAX_CHARS = 64 * 1024
+
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
+        self._sanitizer = OutputSanitizer()
+        self._markers = PromptMarkers()
         self._current_input: list[str] = []
         self._output_buffer: list[str] = []
         self._flush_timeout = 0.2
+        self._flush_max_delay = 1.0
+        self._buffer_started = 0.0
         self._scheduled_flush: Optional[object] = None
         self._last_input = ""
+        self._replaying = False
+        self._opened_at: Optional[float] = None
+        self._frame: list[str] = []
+        self._frame_chars = 0
+        self._frame_sent = 0.0
+        self._scheduled_frame: Optional[object] = None
+        self.session: Optional[Session] = None
+
+    def get_compression_options(self) -> Optional[dict[str, Any]]:
+        return WEBSOCKET_COMPRESSION
 
     def on_message(self, message: str | bytes) -> Any:
         """Handle user input message"""
+        # With shell integration commands come from the program's marks, so
+        # keystrokes are only parsed to be recorded
+        if self.shell_integration and GradeManager.recorder is None:
+            return super().on_message(message)
         try:
             if isinstance(message, str):
                 data = json.loads(message)
                 if data[0] == "stdin":
                     input_text = data[1]
-                    if input_text == "\r":
-                        command = "".join(self._current_input).strip()
-                        if command:
-                            if self._scheduled_flush:
-                                IOLoop.current().remove_timeout(self._scheduled_flush)
-                                self._flush_output_buffer()
-                            logging.info(f"User Command: {command}")
-                            IOLoop.current().add_callback(
-                                self._notify_mission_handler,
-                                {"type": "command", "content": command},
-                            )
-                        self._current_input = []
-                    elif input_text in ("\b", "\x7f"):
-                        if self._current_input:
-                            self._current_input.pop()
-                    else:
-                        self._current_input.append(input_text)
-                        self._last_input = input_text
+                    if self.session is not None:
+                        GradeManager.record(
+                            "stdin", self.session.current_mission, input_text
+                        )
+                    if not self.shell_integration:
+                        self._track_input(input_text)
         except Exception as e:
             logging.error(f"Error parsing terminal input: {e}")
 
         return super().on_message(message)
 
+    def _track_input(self, input_text: str) -> None:
+        """Rebuild the command line from keystrokes, without shell integration"""
+        if input_text == "\r":
+            command = "".join(self._current_input).strip()
+            if command:
+                self._notify_command(command)
+            self._current_input = []
+        elif input_text in ("\b", "\x7f"):
+            if self._current_input:
+                self._current_input.pop()
+        else:
+            self._current_input.append(input_text)
+            self._last_input = input_text
+
+    def _notify_command(self, command: str) -> None:
+        """Log a command after the output before it, and check its missions"""
+        if self._scheduled_flush:
+            IOLoop.current().remove_timeout(self._scheduled_flush)
+            self._flush_output_buffer()
+        logging.info(f"User Command: {command}")
+        IOLoop.current().add_callback(self._notify_session, "command", command)
+
     def check_origin(self, origin: str) -> bool:
         return True
 
-    def write_message(
-        self, message: str | bytes | dict[str, Any], binary: bool = False
-    ) -> Any:
-        """Handle terminal output message"""
+    def open(self, url_component: Any = None) -> None:
+        # On reconnect terminado replays the terminal's read buffer through
+        # on_pty_read; that output was already processed when it was first
+        # read, unless the terminal was started ahead of time by the pool
+        self.session = Session.get(self.get_argument("session", ""))
+        self.session.terminal = self
+        self._opened_at = time.monotonic()
+        self._replaying = True
         try:
-            if isinstance(message, str):
-                data = json.loads(message)
-                if data[0] in ["stdout", "stderr"]:
-                    text = data[1]
-                    # Clean control characters
-                    clean_text = regex.sub(r"\x1b\[[0-9;]*[mK]", "", text)
-                    clean_text = regex.sub(r"\x1b\[\?[0-9]+[hl]", "", clean_text)
-                    clean_text = regex.sub(r"\r\n?", "\n", clean_text)
-                    clean_text = clean_text.replace("\b", "")
-
-                    # If the output is not the last input, the current input, or the
-                    # last input, add it to the buffer
-                    if (
-                        clean_text.strip()
-                        and clean_text.strip() != self._last_input
-                        and clean_text.strip() != "".join(self._current_input)
-                        and not clean_text.strip().endswith(self._last_input)
-                    ):
-                        self._output_buffer.append(clean_text)
-                        self._schedule_flush()
-        except Exception as e:
-            logging.error(f"Error in write_message: {e}")
+            super().open(url_component)
+        finally:
+            self._replaying = False
+
+    def on_pty_read(self, text: str) -> None:
+        """Handle terminal output before it is serialized for the browser"""
+        if not self._replaying or getattr(self.terminal, "prewarmed", False):
+            if self._opened_at is not None:
+                elapsed_ms = (time.monotonic() - self._opened_at) * 1000
+                logging.getLogger("server").info(
+                    f"Time to first prompt: {elapsed_ms:.0f} ms"
+                )
+                self._opened_at = None
+            try:
+                if self.shell_integration:
+                    self._process_marked_output(text)
+                else:
+                    self._process_output(text)
+            except Exception as e:
+                logging.error(f"Error processing terminal output: {e}")
+
+        self._queue_frame(text)
+
+    def _queue_frame(self, text: str) -> None:
+        """Send output to the browser, coalescing reads in quick succession.
+
+        A read after a quiet spell is sent at once, so echoed keystrokes are
+        not delayed; reads that follow within FRAME_DELAY go out as one frame.
+        """
+        self._frame.append(text)
+        self._frame_chars += len(text)
+        if self._frame_chars >= self.FRAME_MAX_CHARS:
+            self._send_frame()
+        elif self._scheduled_frame is None:
+            wait = self._frame_sent + self.FRAME_DELAY - time.monotonic()
+            if wait <= 0:
+                self._send_frame()
+            else:
+                self._scheduled_frame = IOLoop.current().call_later(
+                    wait, self._send_frame
+                )
+
+    def _send_frame(self) -> None:
+        if self._scheduled_frame is not None:
+            IOLoop.current().remove_timeout(self._scheduled_frame)
+            self._scheduled_frame = None
+        if self._frame:
+            text = "".join(self._frame)
+            self._frame = []
+            self._frame_chars = 0
+            self._frame_sent = time.monotonic()
+            super().on_pty_read(text)
+
+    def on_pty_died(self) -> None:
+        self._send_frame()
+        super().on_pty_died()
+
+    def _process_output(self, text: str) -> None:
+        """Clean raw PTY output and pass it to the log and the mission handler"""
+        clean_text = self._sanitizer.feed(text)
+        stripped = clean_text.strip()
+
+        # If the output is not the last input, the current input, or the
+        # last input, add it to the buffer
+        if (
+            stripped
+            and stripped != self._last_input
+            and stripped != "".join(self._current_input)
+            and not stripped.endswith(self._last_input)
+        ):
+            self._notify_output(clean_text)
+
+    def _process_marked_output(self, text: str) -> None:
+        """Pass the commands and output a shell-integrated program marked on"""
+        for kind, content in self._markers.feed(text):
+            if kind == "command":
+                self._notify_command(content)
+                continue
+            clean_text = self._sanitizer.feed(content)
+            if clean_text.strip():
+                self._notify_output(clean_text)
 
-        return super().write_message(message, binary)
+    def _notify_output(self, clean_text: str) -> None:
+        # Missions match the output stream as it arrives; the buffer only
+        # coalesces output for the session log
+        IOLoop.current().add_callback(self._notify_session, "output", clean_text)
+        if not self._output_buffer:
+            self._buffer_started = time.monotonic()
+        self._output_buffer.append(clean_text)
+        self._schedule_flush()
 
     def _schedule_flush(self) -> None:
         """Schedule flushing the output buffer"""
         if self._scheduled_flush:
             IOLoop.current().remove_timeout(self._scheduled_flush)
+            self._scheduled_flush = None
+        # Output that never pauses must not postpone the flush forever
+        if time.monotonic() - self._buffer_started >= self._flush_max_delay:
+            self._flush_output_buffer()
+            return
         self._scheduled_flush = IOLoop.current().call_later(
             self._flush_timeout, self._flush_output_buffer
         )
 
     def _flush_output_buffer(self) -> None:
-        """Flush the output buffer"""
+        """Flush the output buffer to the session log"""
         self._scheduled_flush = None
         if self._output_buffer:
             output = "".join(self._output_buffer)
             if output:
                 logging.info(f"Program Output: {output}")
-                IOLoop.current().add_callback(
-                    self._notify_mission_handler, {"type": "output", "content": output}
-                )
             self._output_buffer = []
 
     def on_close(self):
         """Handle connection closure"""
         if self._scheduled_flush:
             IOLoop.current().remove_timeout(self._scheduled_flush)
+        if self._scheduled_frame is not None:
+            IOLoop.current().remove_timeout(self._scheduled_frame)
         self._flush_output_buffer()
         logging.info("Terminal connection closed")
+        if self.session is not None:
+            if self.session.terminal is self:
+                self.session.terminal = None
+            self.session.release()
+        GradeManager.flush()
         super().on_close()
 
-    def _notify_mission_handler(self, data: dict[str, Any]) -> None:
-        """Notify all active mission handlers"""
-        for handler in MissionHandler.active_connections:
-            try:
-                handler.on_message(json.dumps(data))
-            except Exception as e:
-                logging.error(f"Failed to notify mission handler: {e}")
+    def _notify_session(self, message_type: str, content: str) -> None:
+        """Pass a terminal event to the missions of this page's session"""
+        if self.session is not None:
+            self.session.dispatch(message_type, content)
+
+
+class PooledTermManager(UniqueTermManager):
+    """Gives each websocket its own terminal, started ahead of time if possible.
+
+    Up to `pool_size` terminals run in the background, so a connecting socket
+    gets one whose shell, setup commands and program are already up, and a
+    replacement is spawned asynchronously. Pooled terminals are stopped after
+    `idle_timeout` seconds unused (0 keeps them), which also bounds how stale
+    the files a pooled program loaded at startup can be.
+    """
+
+    def __init__(
+        self, pool_size: int = 0, idle_timeout: float = 0, **kwargs: Any
+    ) -> None:
+        super().__init__(**kwargs)
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        # Pooled terminals with the timeout that expires them
+        self._pool: list[tuple[PtyWithClients, Optional[object]]] = []
+
+    def fill(self) -> None:
+        """Start terminals until the pool is full"""
+        io_loop = IOLoop.current()
+        while len(self._pool) < self.pool_size:
+            term = self.new_terminal()
+            term.prewarmed = True  # type: ignore[attr-defined]
+            self.start_reading(term)
+            expiry = None
+            if self.idle_timeout:
+                expiry = io_loop.call_later(self.idle_timeout, self._expire, term)
+            self._pool.append((term, expiry))
+
+    def get_terminal(self, url_component: Any = None) -> PtyWithClients:
+        """Hand out the oldest usable pooled terminal, or start a new one"""
+        io_loop = IOLoop.current()
+        while self._pool:
+            term, expiry = self._pool.pop(0)
+            if expiry is not None:
+                io_loop.remove_timeout(expiry)
+            if term.ptyproc.isalive():
+                io_loop.add_callback(self.fill)
+                return term
+            self._stop(term)
+
+        term = super().get_terminal(url_component)
+        if self.pool_size:
+            io_loop.add_callback(self.fill)
+        return term
+
+    def _expire(self, term: PtyWithClients) -> None:
+        """Stop a pooled terminal nobody took; the next socket refills the pool"""
+        for index, (pooled, _) in enumerate(self._pool):
+            if pooled is term:
+                del self._pool[index]
+                self._stop(term)
+                return
+
+    def _stop(self, term: PtyWithClients) -> None:
+        if term.ptyproc.isalive():
+            IOLoop.current().add_callback(term.terminate, True)
+
+
+class StartupTimer:
+    """Times the phases of server startup, for a breakdown in server.log"""
+
+    def __init__(self) -> None:
+        self.started = self._last = time.monotonic()
+        self.phases: list[tuple[str, float]] = []
+
+    def mark(self, phase: str) -> None:
+        """End the current phase, naming it"""
+        now = time.monotonic()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def log(self, logger: logging.Logger) -> None:
+        breakdown = ", ".join(
+            f"{phase} {seconds * 1000:.1f} ms" for phase, seconds in self.phases
+        )
+        total_ms = (self._last - self.started) * 1000
+        logger.info(f"Startup took {total_ms:.1f} ms: {breakdown}")
+
+
+def chown_workspace(workdir: str, user: str) -> tuple[int, int]:
+    """Give `user` the workspace entries owned by someone else.
+
+    Walks the workspace without following symlinks and only changes entries
+    whose owner differs, visiting at most MAX_CHOWN_ENTRIES entries so a huge
+    workspace cannot hold up startup. Returns (visited, changed) counts.
+    """
+    account = pwd.getpwnam(user)
+    owner = (account.pw_uid, account.pw_gid)
+    visited = changed = 0
+    pending = [workdir]
+    while pending and visited < MAX_CHOWN_ENTRIES:
+        path = pending.pop()
+        try:
+            st = os.lstat(path)
+            visited += 1
+            if (st.st_uid, st.st_gid) != owner:
+                os.lchown(path, *owner)
+                changed += 1
+            if stat.S_ISDIR(st.st_mode):
+                with os.scandir(path) as entries:
+                    pending.extend(entry.path for entry in entries)
+        except FileNotFoundError:
+            continue
+    return visited, changed
+
+
+def _is_workspace_directory(workdir: Path, relative: Path) -> bool:
+    """Whether every existing part of `relative` under `workdir` is a real
+    directory, not a symlink or a file; missing parts are created later"""
+    path = workdir
+    for part in relative.parts:
+        path = path / part
+        try:
+            mode = os.lstat(path).st_mode
+        except FileNotFoundError:
+            return True
+        if not stat.S_ISDIR(mode):
+            return False
+    return True
+
+
+def copy_prebuilt_workspace(workdir: str) -> int:
+    """Copy the files built into the image that the workspace does not have.
+
+    Files already in the workspace, such as the templates or anything the
+    student rebuilt, are kept. This runs as root on a workspace the student
+    controlled in earlier sessions, so a directory the student replaced with
+    a symlink or a file is skipped with everything in it rather than followed.
+    Returns the number of files copied.
+    """
+    copied = 0
+    for root, dirs, files in os.walk(PREBUILT_WORKSPACE_DIR):
+        relative = Path(root).relative_to(PREBUILT_WORKSPACE_DIR)
+        if not _is_workspace_directory(Path(workdir), relative):
+            dirs.clear()
+            continue
+        target_dir = Path(workdir) / relative
+        for name in files:
+            target = target_dir / name
+            if target.exists() or target.is_symlink():
+                continue
+            target_dir.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(Path(root) / name, target, follow_symlinks=False)
+            copied += 1
+    return copied
+
+
+def install_shell_integration(program: list[str]) -> Optional[list[str]]:
+    """Return `program` loading its shell integration script, if it has one.
+
+    The script is copied out of the runtime directory, which only root can
+    read, into a new directory the student can read but not change.
+    """
+    if os.path.basename(program[0]) not in SHELL_INTEGRATION_SCRIPTS:
+        return None
+    script, option = SHELL_INTEGRATION_SCRIPTS[os.path.basename(program[0])]
+    directory = tempfile.mkdtemp(prefix="checkpoint-")
+    os.chmod(directory, 0o755)
+    path = shutil.copy(Path(__file__).parent / script, directory)
+    os.chmod(path, 0o644)
+    return [program[0], option, path, *program[1:]]
 
 
 def main():
@@ -317,45 +1149,80 @@ def main():
     parser.add_argument("--workdir", type=str, required=True, help="Working directory")
     args = parser.parse_args()
 
-    # Wait for workspace directory to exist and set permissions
-    # Note: PrairieLearn's behavior is to:
-    # 1. Create and start the container
-    # 2. Copy workspace files into the container's workdir
-    # So we need to wait for the directory to exist before setting permissions
-    max_attempts = 10  # Maximum number of attempts to wait
-    attempt = 0
-    while not os.path.exists(args.workdir) and attempt < max_attempts:
-        print(
-            f"Waiting for workspace directory to be created... "
-            f"(attempt {attempt + 1}/{max_attempts})"
-        )
-        time.sleep(1)
-        attempt += 1
+    startup = StartupTimer()
 
-    if not os.path.exists(args.workdir):
+    # PrairieLearn creates and starts the container, then copies the workspace
+    # files into the workdir, so wait for the directory before setting it up
+    if not wait_for_directory(args.workdir, WORKDIR_TIMEOUT):
         print(
             f"Error: Workspace directory {args.workdir} was not created after "
-            f"{max_attempts} seconds"
+            f"{WORKDIR_TIMEOUT} seconds"
         )
-    else:
+    startup.mark("wait for workdir")
+
+    if os.path.isdir(args.workdir):
+        if PREBUILT_WORKSPACE_DIR.is_dir():
+            try:
+                copied = copy_prebuilt_workspace(args.workdir)
+                print(f"Copied {copied} prebuilt files into {args.workdir}")
+            except Exception as e:
+                print(f"Failed to copy prebuilt workspace: {e}")
+            startup.mark("copy prebuilt workspace")
+
         try:
-            # Use subprocess to change ownership to the target user
-            subprocess.run(
-                ["chown", "-R", f"{args.user}:{args.user}", args.workdir], check=True
-            )
+            visited, changed = chown_workspace(args.workdir, args.user)
             os.chmod(args.workdir, 0o700)  # rwx------
             print(
-                f"Successfully set permissions for workspace directory: {args.workdir}"
+                f"Set permissions for workspace directory {args.workdir}: "
+                f"{changed} of {visited} entries changed owner"
             )
+            if visited >= MAX_CHOWN_ENTRIES:
+                print(f"Stopped checking ownership after {visited} entries")
         except Exception as e:
             print(f"Failed to set workspace permissions: {e}")
+        startup.mark("set permissions")
 
     # Set grade directory based on workdir
     GradeManager.set_workdir(args.workdir)
     GradeManager.init()
+    startup.mark("init grade file and logs")
+
+    # Compile mission listeners once; an invalid config aborts startup here
+    # instead of failing on every message
+    Session.listeners = compile_listeners(MISSIONS)
+    startup.mark("compile listeners")
+
+    # Watch the files of file listeners, reading each up to the largest
+    # input one of its listeners accepts
+    limits: dict[str, int] = {}
+    for listener in Session.listeners:
+        if listener.target == "file":
+            assert listener.path is not None
+            limits[listener.path] = max(
+                limits.get(listener.path, 0), listener.max_input
+            )
+    if limits:
+        watcher = WorkspaceWatcher(args.workdir, limits, Session.file_changed)
+        if watcher.start():
+            Session.watcher = watcher
+        else:
+            GradeManager.server_logger.warning(
+                "inotify is not available, file missions cannot complete"
+            )
+        startup.mark("watch workspace files")
 
     # Use program command from config
     program = PROGRAM_COMMAND
+    if SHELL_INTEGRATION:
+        integrated = install_shell_integration(program)
+        if integrated is None:
+            GradeManager.server_logger.warning(
+                f"No shell integration for {program[0]}, reading commands "
+                "from keystrokes"
+            )
+        else:
+            program = integrated
+            TermSocketWithLogging.shell_integration = True
 
     # Prepare setup commands
     setup_script = " && ".join(SETUP_COMMANDS) if SETUP_COMMANDS else ""
@@ -364,13 +1231,17 @@ def main():
         shell_command += f" && {setup_script}"
     shell_command += f' && exec {" ".join(program)}'
 
-    term_manager = UniqueTermManager(
-        shell_command=["su", "-l", args.user, "--session-command", shell_command]
+    term_manager = PooledTermManager(
+        pool_size=TERMINAL_POOL_SIZE,
+        idle_timeout=TERMINAL_POOL_IDLE_TIMEOUT,
+        shell_command=["su", "-l", args.user, "--session-command", shell_command],
     )
 
     current_dir = os.path.dirname(os.path.abspath(__file__))
 
-    settings = {"static_path": current_dir, "debug": True}
+    # No debug mode: it would watch every module for autoreload and turn off
+    # template and static file caching
+    settings = {"static_path": current_dir}
 
     app = Application(
         [
@@ -389,7 +1260,19 @@ def main():
 
     print(f"Server starting on port {args.port}...")
     app.listen(args.port, "0.0.0.0")
-    IOLoop.current().start()
+    startup.mark("start server")
+    term_manager.fill()
+    startup.mark("start terminal pool")
+    startup.log(GradeManager.server_logger)
+
+    # Stop the loop on `docker stop` so pending grade updates reach the disk
+    io_loop = IOLoop.current()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        io_loop.asyncio_loop.add_signal_handler(signum, io_loop.stop)  # type: ignore
+    try:
+        io_loop.start()
+    finally:
+        GradeManager.close()
 
 
 if __name__ == "__main__":
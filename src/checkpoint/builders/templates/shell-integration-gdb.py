@@ -0,0 +1,45 @@
+"""Shell integration for gdb under the checkpoint server, loaded with -x.
+
+Marks each prompt and command in the terminal output with OSC 133 sequences,
+like shell-integration.bash. gdb has no hook that runs before a command, so
+instead of C (the command line, as it starts) it sends E (the command line,
+once it is done), read back from gdb's command history.
+"""
+
+import re
+from typing import Optional
+
+import gdb  # type: ignore
+
+HISTORY_ENTRY = re.compile(r"\s*(\d+)\s+(.*)")
+CONTROL = re.compile(r"[\x00-\x1f\x7f]")
+
+
+def last_command() -> Optional[tuple[str, str]]:
+    """Number and text of the last command in gdb's history"""
+    lines = gdb.execute("show commands", to_string=True).splitlines()
+    entry = HISTORY_ENTRY.fullmatch(lines[-1]) if lines else None
+    return None if entry is None else (entry.group(1), entry.group(2))
+
+
+# Commands already in the history when gdb starts were not run here
+_reported = last_command()
+
+
+def mark_prompt(current_prompt: str) -> str:
+    global _reported
+    command = last_command()
+    marks = ""
+    # An empty line repeats the last command without adding it to the history
+    if command is not None and command != _reported:
+        marks += f"\x1b]133;E;{CONTROL.sub(' ', command[1])}\x07"
+        _reported = command
+    # A is written here rather than put in the prompt: readline redraws the
+    # prompt after listing completions, and only a new prompt starts with A
+    gdb.write(f"{marks}\x1b]133;D\x07\x1b]133;A\x07")
+    gdb.flush()
+    # \001 and \002 tell readline the mark takes no space on screen
+    return f"{current_prompt}\001\x1b]133;B\x07\002"
+
+
+gdb.prompt_hook = mark_prompt
@@ -0,0 +1,38 @@
+# Shell integration for bash under the checkpoint server, loaded with
+# --rcfile. Marks each prompt and command in the terminal output with OSC 133
+# sequences, which the server reads instead of reconstructing commands from
+# keystrokes (see PromptMarkers in server.py):
+#   ESC ] 133 ; A BEL           prompt starts
+#   ESC ] 133 ; B BEL           prompt ends, the command line follows
+#   ESC ] 133 ; C ; <line> BEL  the command line runs, its output follows
+#   ESC ] 133 ; D ; <status> BEL  the command is done
+
+[ -f ~/.bashrc ] && . ~/.bashrc
+
+# The command line is read back from the history, so every line must get there
+HISTCONTROL=
+HISTIGNORE=
+
+__checkpoint_prompt() {
+    printf '\e]133;D;%s\a\e]133;A\a' "$__checkpoint_status"
+    [[ $PS1 == *'133;B'* ]] || PS1+='\[\e]133;B\a\]'
+    __checkpoint_ready=1
+}
+
+# Runs before every simple command; only the first after a prompt is a new
+# command line, and PROMPT_COMMAND itself starts by saving the status
+__checkpoint_preexec() {
+    if [[ $BASH_COMMAND == '__checkpoint_status=$?' ]]; then
+        __checkpoint_ready=
+    fi
+    [[ -n $__checkpoint_ready ]] || return
+    __checkpoint_ready=
+    local line
+    line=$(HISTTIMEFORMAT= builtin history 1)
+    [[ $line =~ ^[[:space:]]*[0-9]+\*?[[:space:]]+(.*)$ ]] && line=${BASH_REMATCH[1]}
+    printf '\e]133;C;%s\a' "${line//[[:cntrl:]]/ }"
+}
+
+# Separated by newlines, as a PROMPT_COMMAND may end with a semicolon
+PROMPT_COMMAND="__checkpoint_status=\$?"$'\n'"$PROMPT_COMMAND"$'\n'__checkpoint_prompt
+trap __checkpoint_preexec DEBUG
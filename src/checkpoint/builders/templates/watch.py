@@ -0,0 +1,263 @@
+"""Filesystem watching for the container server, on inotify where available.
+
+Thin ctypes bindings for Linux inotify, so the server can wait on workspace
+changes instead of polling, without another package in the image, and a
+watcher that reads the files of file listeners whenever they change.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import stat
+import struct
+import time
+from collections.abc import Callable
+from typing import Optional
+
+from tornado.ioloop import IOLoop
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+_IN_CLOEXEC = 0o2000000
+_IN_NONBLOCK = 0o4000
+# struct inotify_event: wd, mask, cookie, len, then `len` bytes of name
+_EVENT = struct.Struct("iIII")
+
+# Seconds a watched file must stay quiet before it is read, so an editor's
+# save or a program writing in bursts is checked once
+DEBOUNCE_DELAY = 0.2
+# A watched file is written (also by a program that keeps it open, so without
+# a close; the debounce merges the writes), moved or created in its
+# directory, or a missing directory on the way to it is created
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+
+class Inotify:
+    """A non-blocking inotify instance; its fd can be polled or added to an IOLoop"""
+
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def add_watch(self, path: str, mask: int) -> int:
+        """Watch `path` for the events in `mask`, returning the watch descriptor"""
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code), path)
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        self._rm_watch(self.fd, wd)
+
+    def read(self) -> list[tuple[int, int, str]]:
+        """Return the pending events as (watch descriptor, mask, name)"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+    def __enter__(self) -> "Inotify":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+def open_inotify() -> Optional[Inotify]:
+    """Return an inotify instance, or None where inotify is not available"""
+    try:
+        return Inotify()
+    except (AttributeError, OSError):
+        return None
+
+
+def wait_for_directory(path: str, timeout: float) -> bool:
+    """Wait until `path` is a directory, at most `timeout` seconds.
+
+    Wakes on inotify events in the parent directory; without inotify, or
+    while the parent does not exist either, polls with a short backoff.
+    """
+    if os.path.isdir(path):
+        return True
+    deadline = time.monotonic() + timeout
+    parent = os.path.dirname(os.path.abspath(path))
+    delay = 0.005
+    inotify = open_inotify()
+    try:
+        watching = False
+        while not os.path.isdir(path):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if inotify is not None and not watching:
+                try:
+                    mask = IN_CREATE | IN_MOVED_TO | IN_ONLYDIR
+                    inotify.add_watch(parent, mask)
+                    watching = True
+                    continue  # It may have appeared before the watch was added
+                except OSError as e:
+                    if e.errno not in (errno.ENOENT, errno.ENOTDIR):
+                        inotify.close()
+                        inotify = None
+            if watching:
+                assert inotify is not None
+                select.select([inotify], [], [], remaining)
+                inotify.read()
+            else:
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, 0.25)
+        return True
+    finally:
+        if inotify is not None:
+            inotify.close()
+
+
+class WorkspaceWatcher:
+    """Reads watched workspace files when they change and passes them on.
+
+    `limits` maps each watched path, relative to `workdir`, to the most bytes
+    read from it; a longer file is read up to one byte past the limit so
+    listeners can tell it is too long. The directory of each path is watched
+    with inotify, or its nearest existing ancestor until the directory is
+    created, and events for the same path are debounced by DEBOUNCE_DELAY
+    seconds. `on_change(path, content)` runs on the IOLoop when a path's
+    content changed, with the bytes decoded as UTF-8 with surrogateescape.
+    """
+
+    def __init__(
+        self,
+        workdir: str,
+        limits: dict[str, int],
+        on_change: Callable[[str, str], None],
+        delay: float = DEBOUNCE_DELAY,
+    ) -> None:
+        self.workdir = os.path.abspath(workdir)
+        self.limits = limits
+        self.on_change = on_change
+        self.delay = delay
+        self._inotify: Optional[Inotify] = None
+        self._directories: dict[int, str] = {}  # Watched directory by wd
+        self._pending: dict[str, object] = {}  # Debounce timeout by path
+        self._last: dict[str, int] = {}  # Hash of the content last passed on
+
+    def start(self) -> bool:
+        """Start watching; returns False where inotify is not available"""
+        self._inotify = open_inotify()
+        if self._inotify is None:
+            return False
+        self._watch_all()
+        IOLoop.current().add_handler(
+            self._inotify.fileno(), self._on_events, IOLoop.READ
+        )
+        return True
+
+    def read(self, path: str) -> Optional[str]:
+        """Read a watched file up to its limit, or None if it is not a file"""
+        try:
+            # Non-blocking, so a FIFO in its place cannot hang the server
+            fd = os.open(os.path.join(self.workdir, path), os.O_RDONLY | os.O_NONBLOCK)
+        except OSError:
+            return None
+        try:
+            if not stat.S_ISREG(os.fstat(fd).st_mode):
+                return None
+            with open(fd, "rb", closefd=False) as f:
+                data = f.read(self.limits[path] + 1)
+        except OSError:
+            return None
+        finally:
+            os.close(fd)
+        return data.decode("utf-8", "surrogateescape")
+
+    def _watch_all(self) -> None:
+        assert self._inotify is not None
+        for path in self.limits:
+            directory = os.path.dirname(os.path.join(self.workdir, path))
+            while True:
+                try:
+                    wd = self._inotify.add_watch(directory, WATCH_MASK | IN_ONLYDIR)
+                    self._directories[wd] = directory
+                    break
+                except OSError as e:
+                    if e.errno not in (errno.ENOENT, errno.ENOTDIR):
+                        raise
+                    if directory == self.workdir:
+                        break
+                    directory = os.path.dirname(directory)
+
+    def _on_events(self, fd: int, events: int) -> None:
+        assert self._inotify is not None
+        rewatch = False
+        for wd, mask, name in self._inotify.read():
+            if mask & IN_Q_OVERFLOW:
+                rewatch = True
+            elif mask & IN_IGNORED:
+                self._directories.pop(wd, None)
+                rewatch = True
+            elif mask & IN_ISDIR:
+                rewatch = True
+            elif wd in self._directories:
+                full = os.path.join(self._directories[wd], name)
+                path = os.path.relpath(full, self.workdir)
+                if path in self.limits:
+                    self._schedule(path)
+        if rewatch:
+            # Directories came or went, or events were lost: watch the new
+            # directories and check every path. This also catches a file
+            # written into a new directory before its watch was added, as with
+            # `mkdir -p a/b && echo x > a/b/f`
+            self._watch_all()
+            for path in self.limits:
+                self._schedule(path)
+
+    def _schedule(self, path: str) -> None:
+        io_loop = IOLoop.current()
+        pending = self._pending.pop(path, None)
+        if pending is not None:
+            io_loop.remove_timeout(pending)
+        self._pending[path] = io_loop.call_later(self.delay, self._changed, path)
+
+    def _changed(self, path: str) -> None:
+        del self._pending[path]
+        content = self.read(path)
+        if content is None or hash(content) == self._last.get(path):
+            return
+        self._last[path] = hash(content)
+        self.on_change(path, content)
@@ -1,19 +1,32 @@
+import json
+import sys
+import time
 import uuid
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
 import click
 import docker
 import regex
 import yaml
 
-from .builders.docker import DockerBuilder, check_docker_auth, raw_regex
+from .builders.docker import (
+    BuildReport,
+    DockerBuilder,
+    ImageSize,
+    PushReport,
+    check_docker_auth,
+)
 from .builders.question import QuestionBuilder
+from .builders.templates.missions import RegexMatcher, compile_listeners
 from .constants import (
     DEFAULT_CONFIG_PATH,
     WORKSPACE_TEMPLATES_PATH,
 )
+from .course import CourseDeployer, QuestionResult, find_questions
 from .models.question import CheckpointQuestion
+from .replay import find_sessions, question_missions, replay_sessions
+from .validation import validate_flag
 
 
 @click.group()
@@ -44,6 +57,7 @@ def init():
             "program_args": [],
             "packages": [],
             "setup_commands": [],
+            "build_commands": [],
         },
         "flags": [
             {
@@ -77,9 +91,171 @@ def login():
     click.echo("✨ Successfully logged in to Docker Hub")
 
 
+def _echo_layer_reuse(builder: DockerBuilder, image_name: str) -> None:
+    """Show how much of the image is the runtime image shared across questions"""
+    reuse = builder.layer_reuse(image_name)
+    click.echo(
+        f"♻️  Runtime image {reuse.runtime_image} ({builder.runtime_source}): "
+        f"{reuse.shared_layers} layers, {reuse.shared_bytes / 1e6:.1f} MB shared "
+        f"by every question on {builder.config.image.base}"
+    )
+    click.echo(
+        f"   This question adds {reuse.own_layers} layers, "
+        f"{reuse.own_bytes / 1e6:.1f} MB; registries and workspace hosts that "
+        f"already have the runtime image skip the other "
+        f"{reuse.shared_bytes / 1e6:.1f} MB"
+    )
+
+
+def _echo_build_output(line: str) -> None:
+    click.echo(f"   {line}")
+
+
+def _echo_build_summary(reports: list[BuildReport]) -> None:
+    """Show the time of every step of the images just built"""
+    for report in reports:
+        cached = sum(1 for step in report.steps if step.cached)
+        click.echo(
+            f"⏱️  {report.tag}: {report.seconds:.1f}s, "
+            f"{cached}/{len(report.steps)} steps cached"
+        )
+        for step in report.steps:
+            click.echo(f"   {step.summary()}")
+
+
+def _write_summary_json(path: Path, data: Any) -> None:
+    path.write_text(json.dumps(data, indent=2))
+    click.echo(f"📝 Wrote the build summary to {path}")
+
+
+def _echo_image_size(size: ImageSize, layers: bool) -> None:
+    """Show the image size against its budget, and its layers if asked or over"""
+    budget = ""
+    if size.budget_bytes is not None:
+        budget = f" (budget {size.budget_bytes / 1e6:.1f} MB)"
+    status = "❌" if size.over_budget else "📏"
+    click.echo(f"{status} Image size: {size.bytes / 1e6:.1f} MB{budget}")
+    if layers or size.over_budget:
+        for layer in sorted(size.layers, key=lambda layer: -layer.bytes):
+            instruction = " ".join(layer.instruction.split())
+            if len(instruction) > 70:
+                instruction = instruction[:67] + "..."
+            click.echo(f"   {layer.bytes / 1e6:>8.1f} MB  {instruction}")
+    if size.over_budget:
+        click.echo(
+            "❌ The image is over its size budget; try `image.slim: true` or "
+            "fewer packages"
+        )
+
+
+def _echo_push_report(report: PushReport) -> None:
+    """Show what a push uploaded and what the registry already had"""
+    if report.skipped:
+        click.echo(f"⏭️  {report.tag} is already in the registry, skipped the push")
+        return
+    uploaded = sum(layer.bytes for layer in report.uploaded)
+    present = sum(layer.bytes for layer in report.present)
+    click.echo(
+        f"📦 {report.tag}: uploaded {len(report.uploaded)} layers "
+        f"({uploaded / 1e6:.1f} MB), {len(report.present)} already present "
+        f"({present / 1e6:.1f} MB) in {report.seconds:.1f}s"
+    )
+    for layer in report.layers:
+        click.echo(
+            f"   {layer.id} {layer.status:<7} {layer.bytes / 1e6:>8.1f} MB "
+            f"{layer.seconds:>6.1f}s"
+        )
+
+
+def _deploy_all(
+    force: bool, push: bool, jobs: Optional[int], summary_json: Optional[Path]
+) -> None:
+    """Build (and push and generate) every question under the current directory"""
+    question_dirs = find_questions(Path("."))
+    if not question_dirs:
+        click.echo(f"❌ No {DEFAULT_CONFIG_PATH} found under the current directory")
+        sys.exit(1)
+
+    jobs = jobs or 4
+    if push:
+        registries = set()
+        for question_dir in question_dirs:
+            try:
+                config = CheckpointQuestion.from_yaml(
+                    question_dir / DEFAULT_CONFIG_PATH
+                )
+            except Exception:
+                continue  # Reported with the question's result
+            registries.add(config.image.registry)
+        missing = sorted(r for r in registries if not check_docker_auth(r))
+        if missing:
+            click.echo(f"❌ Docker Hub credentials not found for {', '.join(missing)}")
+            sys.exit(1)
+
+    action = "Deploying" if push else "Building"
+    click.echo(f"🔨 {action} {len(question_dirs)} questions with {jobs} workers")
+    start = time.perf_counter()
+    results: list[QuestionResult] = []
+    for result in CourseDeployer(jobs, force=force, push=push).run(question_dirs):
+        results.append(result)
+        if result.error:
+            click.echo(f"❌ {result.path}: {result.error}")
+        else:
+            click.echo(f"✅ {result.path}: {result.status} in {result.seconds:.1f}s")
+
+    results.sort(key=lambda result: result.path)
+    width = max(len("Question"), *(len(result.path) for result in results))
+    click.echo(
+        f"\n{'Question':<{width}}  {'Status':<8}  {'Runtime':<7}  "
+        f"{'Size':>9}  {'Build':>7}  {'Push':>7}  {'Uploaded':>9}  {'Total':>7}"
+    )
+    for result in results:
+        click.echo(
+            f"{result.path:<{width}}  {result.status:<8}  "
+            f"{result.runtime_source or '-':<7}  {result.image_bytes / 1e6:>6.1f} MB  "
+            f"{result.build_seconds:>6.1f}s  "
+            f"{result.push_seconds:>6.1f}s  {result.uploaded_bytes / 1e6:>6.1f} MB  "
+            f"{result.seconds:>6.1f}s"
+        )
+
+    if summary_json:
+        _write_summary_json(summary_json, [result.model_dump() for result in results])
+
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for result in results if result.error)
+    click.echo(f"\n⏱️  {len(results)} questions in {elapsed:.1f}s")
+    if failed:
+        click.echo(f"❌ {failed} of {len(results)} questions failed")
+        sys.exit(1)
+    click.echo("✨ All questions done")
+
+
 @cli.command()
-def build():
+@click.option(
+    "--force",
+    is_flag=True,
+    help="Build even if nothing changed since the last build",
+)
+@click.option(
+    "--all",
+    "all_questions",
+    is_flag=True,
+    help="Build every question with a checkpoint.yaml under the current directory",
+)
+@click.option("--jobs", "-j", type=int, help="Parallel builds with --all (default: 4)")
+@click.option(
+    "--summary-json",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Write the time of every build step to this JSON file",
+)
+def build(
+    force: bool, all_questions: bool, jobs: Optional[int], summary_json: Optional[Path]
+):
     """Build Docker image only"""
+    if all_questions:
+        _deploy_all(force, push=False, jobs=jobs, summary_json=summary_json)
+        return
+
     if not DEFAULT_CONFIG_PATH.exists():
         click.echo(f"❌ {DEFAULT_CONFIG_PATH} not found")
         click.echo("Run 'checkpoint init' to create a new checkpoint")
@@ -90,8 +266,41 @@ def build():
 
     click.echo(f"🔨 Building image: {image_name}")
     builder = DockerBuilder(config)
-    image_id = builder.build(image_name)
-    click.echo(f"✨ Built image: {image_id}")
+    image_id = builder.build(image_name, force=force, progress=_echo_build_output)
+    _echo_build_summary(builder.build_reports)
+    if builder.reused:
+        click.echo(f"✨ Nothing changed since the last build, reusing: {image_id}")
+    else:
+        click.echo(f"✨ Built image: {image_id}")
+    if summary_json:
+        _write_summary_json(
+            summary_json, [report.model_dump() for report in builder.build_reports]
+        )
+    _echo_layer_reuse(builder, image_name)
+    size = builder.image_size(image_name)
+    _echo_image_size(size, layers=False)
+    if size.over_budget:
+        sys.exit(1)
+
+
+@cli.command()
+def size():
+    """Show the size of the built image by layer, against its budget"""
+    if not DEFAULT_CONFIG_PATH.exists():
+        click.echo(f"❌ {DEFAULT_CONFIG_PATH} not found")
+        return
+
+    config = CheckpointQuestion.from_yaml(DEFAULT_CONFIG_PATH)
+    image_name = config.image.get_full_name()
+    builder = DockerBuilder(config)
+    try:
+        image_size = builder.image_size(image_name)
+    except docker.errors.ImageNotFound:
+        click.echo(f"❌ {image_name} not found, run 'checkpoint build' first")
+        sys.exit(1)
+    _echo_image_size(image_size, layers=True)
+    if image_size.over_budget:
+        sys.exit(1)
 
 
 @cli.command()
@@ -110,7 +319,8 @@ def push():
 
     click.echo(f"🚀 Pushing image {image_name} to Docker Hub")
     builder = DockerBuilder(config)
-    builder.push(image_name)
+    for report in builder.push(image_name):
+        _echo_push_report(report)
     click.echo("✨ Image pushed")
 
 
@@ -133,8 +343,31 @@ def generate():
 
 
 @cli.command()
-def deploy():
+@click.option(
+    "--force",
+    is_flag=True,
+    help="Build even if nothing changed since the last build",
+)
+@click.option(
+    "--all",
+    "all_questions",
+    is_flag=True,
+    help="Deploy every question with a checkpoint.yaml under the current directory",
+)
+@click.option("--jobs", "-j", type=int, help="Parallel builds with --all (default: 4)")
+@click.option(
+    "--summary-json",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Write the time of every build step to this JSON file",
+)
+def deploy(
+    force: bool, all_questions: bool, jobs: Optional[int], summary_json: Optional[Path]
+):
     """Full deployment: build, push and generate"""
+    if all_questions:
+        _deploy_all(force, push=True, jobs=jobs, summary_json=summary_json)
+        return
+
     if not DEFAULT_CONFIG_PATH.exists():
         click.echo(f"❌ {DEFAULT_CONFIG_PATH} not found")
         click.echo("Run 'checkpoint init' to create a new checkpoint")
@@ -150,11 +383,25 @@ def deploy():
     # 1. Build Docker image
     click.echo(f"🔨 Building image: {image_name}")
     docker_builder = DockerBuilder(config)
-    docker_builder.build(image_name)
+    docker_builder.build(image_name, force=force, progress=_echo_build_output)
+    _echo_build_summary(docker_builder.build_reports)
+    if docker_builder.reused:
+        click.echo("✨ Nothing changed since the last build, reusing the image")
+    if summary_json:
+        _write_summary_json(
+            summary_json,
+            [report.model_dump() for report in docker_builder.build_reports],
+        )
+    _echo_layer_reuse(docker_builder, image_name)
+    size = docker_builder.image_size(image_name)
+    _echo_image_size(size, layers=False)
+    if size.over_budget:
+        sys.exit(1)
 
     # 2. Push to registry
     click.echo(f"🚀 Pushing image {image_name} to Docker Hub")
-    docker_builder.push(image_name)
+    for report in docker_builder.push(image_name):
+        _echo_push_report(report)
 
     # 3. Generate question files
     click.echo("📝 Generating question files...")
@@ -165,32 +412,59 @@ def deploy():
 
 
 @cli.command()
-@click.argument("mission_number", type=int)
-def validate(mission_number: int):
-    """Interactive validation for specific mission regex pattern"""
+@click.argument("mission_number", type=int, required=False)
+@click.option(
+    "--batch",
+    is_flag=True,
+    help="Check sample files non-interactively; exit non-zero on failure",
+)
+def validate(mission_number: Optional[int], batch: bool):
+    """Validate mission listeners interactively or against sample files
+
+    With --batch, every mission (or only MISSION_NUMBER) is checked against
+    the samples declared under `samples:` in checkpoint.yaml and the files in
+    samples/<mission number>/positive and samples/<mission number>/negative.
+    """
     if not DEFAULT_CONFIG_PATH.exists():
         click.echo(f"❌ {DEFAULT_CONFIG_PATH} not found")
+        if batch:
+            sys.exit(1)
         return
 
     config = CheckpointQuestion.from_yaml(DEFAULT_CONFIG_PATH)
 
-    if mission_number < 1 or mission_number > len(config.flags):
+    if (mission_number is None and not batch) or (
+        mission_number is not None
+        and (mission_number < 1 or mission_number > len(config.flags))
+    ):
         click.echo("❌ Invalid mission number. Available missions:")
         for i, flag in enumerate(config.flags, 1):
             click.echo(f"{i}. {flag.title}")
+        if batch:
+            sys.exit(1)
         return
 
+    if batch:
+        if not _validate_batch(config, mission_number):
+            sys.exit(1)
+        return
+
+    assert mission_number is not None
     flag = config.flags[mission_number - 1]
-    pattern_str = raw_regex(flag.listener.match)
-    pattern: str = eval(pattern_str)
 
     try:
-        compiled_regex = regex.compile(pattern, regex.DOTALL)
-        click.echo(f"\nMission {mission_number}: {flag.title}")
-        click.echo(f"regex pattern: {compiled_regex.pattern}")
-    except regex.error as e:
-        click.echo(f"❌ Invalid regex pattern: {e}")
+        listener = compile_listeners(question_missions(config))[mission_number - 1]
+    except ValueError as e:
+        click.echo(f"❌ {e}")
         return
+    click.echo(f"\nMission {mission_number}: {flag.title}")
+    # Regex listeners (and any_of, one combined regex) also show partial matches
+    compiled_regex = None
+    if isinstance(listener, RegexMatcher):
+        compiled_regex = listener.compiled
+        click.echo(f"regex pattern: {compiled_regex.pattern}")
+    else:
+        click.echo(f"{listener.type} pattern: {listener.pattern}")
 
     click.echo(
         "\nEnter output to validate (double empty line to submit, Ctrl+C to exit):"
@@ -213,6 +487,9 @@ def validate(mission_number: int):
                 continue
 
             output = "\n".join(lines)
+            if compiled_regex is None:
+                click.echo("✅ Match!" if listener.match(output) else "❌ No match")
+                continue
             match = compiled_regex.search(output, partial=True)
             if match:
                 if match.partial:
@@ -228,3 +505,150 @@ def validate(mission_number: int):
             break
         except regex.error as e:
             click.echo(f"❌ Regex error: {e}")
+
+
+def _validate_batch(config: CheckpointQuestion, mission_number: Optional[int]) -> bool:
+    """Check the samples of every (or one) mission, True if all of them pass"""
+    try:
+        listeners = compile_listeners(question_missions(config))
+    except ValueError as e:
+        click.echo(f"❌ {e}")
+        return False
+
+    base_dir = DEFAULT_CONFIG_PATH.parent
+    total = failed = 0
+    for number, (flag, listener) in enumerate(zip(config.flags, listeners), 1):
+        if mission_number is not None and number != mission_number:
+            continue
+
+        click.echo(
+            f"\nMission {number}: {flag.title} "
+            f"({listener.type}/{listener.target}: {listener.pattern!r})"
+        )
+        try:
+            results = validate_flag(flag, number, listener, base_dir)
+        except OSError as e:
+            click.echo(f"  ❌ Could not read samples: {e}")
+            failed += 1
+            continue
+        if not results:
+            click.echo("  ⚠️  No samples")
+            continue
+
+        for result in results:
+            total += 1
+            status = "✅" if result.passed else "❌"
+            outcome = "matched" if result.matched else "no match"
+            if result.timed_out:
+                outcome = f"timed out after {listener.timeout * 1000:.0f} ms"
+            click.echo(
+                f"  {status} {result.kind:<8} {result.path}: {outcome} "
+                f"({result.seconds * 1000:.3f} ms)"
+            )
+            if result.partial is not None:
+                click.echo(f"     🔍 Partial match up to: {result.partial!r}")
+            if not result.passed:
+                failed += 1
+        slowest = max(result.seconds for result in results)
+        click.echo(f"  ⏱️  Slowest match: {slowest * 1000:.3f} ms")
+
+    if failed:
+        click.echo(f"\n❌ {failed} of {total} samples failed")
+        return False
+    click.echo(f"\n✨ All {total} samples passed")
+    return True
+
+
+@cli.command()
+@click.argument(
+    "paths", nargs=-1, required=True, type=click.Path(exists=True, path_type=Path)
+)
+@click.option("--jobs", "-j", type=int, help="Worker processes (default: CPU count)")
+@click.option(
+    "--json",
+    "json_path",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Also write the results to this JSON file",
+)
+@click.option("--quiet", "-q", is_flag=True, help="Only print the summary")
+def replay(
+    paths: tuple[Path, ...],
+    jobs: Optional[int],
+    json_path: Optional[Path],
+    quiet: bool,
+):
+    """Replay recorded sessions against the missions of this question
+
+    PATHS are session.log files, session.jsonl.gz recordings, or directories
+    searched recursively for them. Exits with status 1 if any session could
+    not be read.
+    """
+    if not DEFAULT_CONFIG_PATH.exists():
+        click.echo(f"❌ {DEFAULT_CONFIG_PATH} not found")
+        return
+
+    config = CheckpointQuestion.from_yaml(DEFAULT_CONFIG_PATH)
+    missions = question_missions(config)
+    sessions = find_sessions(paths)
+    if not sessions:
+        click.echo("❌ No session.log files or recordings found")
+        sys.exit(1)
+
+    click.echo(
+        f"🔁 Replaying {len(sessions)} sessions against {len(missions)} missions"
+    )
+    start = time.perf_counter()
+    results = []
+    completions = [0] * len(missions)
+    unverifiable = [0] * len(missions)
+    failed = 0
+    for result in replay_sessions(sessions, missions, jobs):
+        results.append(result)
+        for completion in result.completed:
+            completions[completion.mission - 1] += 1
+        for mission in result.unverifiable:
+            unverifiable[mission - 1] += 1
+        if result.error:
+            failed += 1
+            click.echo(f"❌ {result.path}: {result.error}")
+        elif not quiet:
+            status = "✅" if len(result.completed) == len(missions) else "🔸"
+            progress = ", ".join(
+                f"{c.mission} at {c.location}" for c in result.completed
+            )
+            if result.unverifiable:
+                status = "⚠️"
+                progress = (
+                    f"{progress or 'none completed'}; unverifiable: "
+                    f"{', '.join(map(str, result.unverifiable))}"
+                )
+            click.echo(
+                f"{status} {result.path}: {len(result.completed)}/{len(missions)} "
+                f"missions ({progress or 'none completed'})"
+            )
+
+    click.echo("\nMissions completed across sessions:")
+    for index, (mission, count) in enumerate(zip(missions, completions), 1):
+        line = f"{index}. {mission['title']}: {count}/{len(sessions)}"
+        if unverifiable[index - 1]:
+            line += f" ({unverifiable[index - 1]} unverifiable)"
+        click.echo(line)
+    elapsed = time.perf_counter() - start
+    click.echo(f"✨ Replayed {len(sessions)} sessions in {elapsed:.2f}s")
+    if any(unverifiable):
+        click.echo(
+            f"⚠️ {sum(1 for r in results if r.unverifiable)} sessions were "
+            "replayed from session.log, which does not record file changes: "
+            "file missions and the missions depending on them are "
+            "unverifiable. Replay the session.jsonl.gz recordings instead."
+        )
+    if failed:
+        click.echo(f"❌ {failed} sessions could not be read")
+
+    if json_path:
+        json_path.write_text(
+            json.dumps([result.model_dump() for result in results], indent=2)
+        )
+        click.echo(f"📝 Wrote results to {json_path}")
+    if failed:
+        sys.exit(1)
@@ -3,5 +3,12 @@ from pathlib import Path
 DEFAULT_CONFIG_PATH = Path("checkpoint.yaml")
 WORKSPACE_TEMPLATES_PATH = Path("workspaceTemplates")
 QUESTION_HTML_PATH = Path("question.html")
+# Listener samples: samples/<mission number>/{positive,negative}/*
+SAMPLES_PATH = Path("samples")
+
+# Digest of each build context and the image built from it
+BUILD_MANIFEST_PATH = Path.home() / ".cache" / "checkpoint" / "builds.json"
 
 RUNTIME_DIR = Path("/checkpoint_runtime")
+# Workspace as left by build_commands, next to server.py in the image
+PREBUILT_WORKSPACE_DIR = RUNTIME_DIR / "prebuilt_workspace"
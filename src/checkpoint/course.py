@@ -0,0 +1,144 @@
+"""Building and deploying every question of a course in parallel"""
+
+import os
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Optional
+
+import docker
+from pydantic import BaseModel
+
+from .builders.docker import BuildReport, DockerBuilder, RuntimeImage
+from .builders.question import QuestionBuilder
+from .constants import DEFAULT_CONFIG_PATH
+from .models.question import CheckpointQuestion
+
+
+class QuestionResult(BaseModel):
+    path: str  # Question directory
+    image: str = ""
+    status: str = "pending"  # 'built', 'reused', 'deployed' or 'failed'
+    image_bytes: int = 0
+    runtime_source: str = ""  # 'present', 'pulled' or 'built'
+    build_seconds: float = 0.0
+    push_seconds: float = 0.0
+    uploaded_bytes: int = 0  # Sent to the registry, with any runtime image
+    builds: list[BuildReport] = []  # Step timings of the images built
+    error: Optional[str] = None
+
+    @property
+    def seconds(self) -> float:
+        return self.build_seconds + self.push_seconds
+
+
+def find_questions(root: Path) -> list[Path]:
+    """Directories under `root` with a checkpoint.yaml, skipping hidden ones"""
+    questions = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith("."))
+        if DEFAULT_CONFIG_PATH.name in filenames:
+            questions.append(Path(dirpath))
+    return questions
+
+
+class CourseDeployer:
+    """Build (and optionally push and generate) many questions at once.
+
+    Builds run on a pool of `jobs` threads, and each question's push runs on
+    a second pool as soon as its build is done, so uploads overlap with the
+    remaining builds. Questions on the same registry, base and slim setting
+    share one RuntimeImage, which is therefore built or pulled, and pushed,
+    only once.
+    A failing question is reported in its result and does not stop the rest.
+    """
+
+    def __init__(self, jobs: int, force: bool = False, push: bool = True) -> None:
+        self.jobs = jobs
+        self.force = force
+        self.push = push
+        self._runtimes: dict[tuple[str, str, bool], RuntimeImage] = {}
+        self._lock = threading.Lock()
+
+    def run(self, question_dirs: Iterable[Path]) -> Iterator[QuestionResult]:
+        """Yield the result of each question as soon as it is finished"""
+        build_pool = ThreadPoolExecutor(self.jobs, "build")
+        push_pool = ThreadPoolExecutor(self.jobs, "push")
+        with build_pool, push_pool:
+            builds = {
+                build_pool.submit(self._build, question_dir)
+                for question_dir in question_dirs
+            }
+            pushes: set[Future] = set()
+            while builds or pushes:
+                done, _ = wait(builds | pushes, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in pushes:
+                        pushes.discard(future)
+                        yield future.result()
+                        continue
+                    builds.discard(future)
+                    result, builder = future.result()
+                    if builder is not None and self.push:
+                        pushes.add(push_pool.submit(self._push, result, builder))
+                    else:
+                        yield result
+
+    def _runtime(self, config: CheckpointQuestion) -> RuntimeImage:
+        image = config.image
+        key = (image.registry, image.base, image.slim)
+        with self._lock:
+            if key not in self._runtimes:
+                self._runtimes[key] = RuntimeImage(
+                    image.registry, image.base, docker.from_env(), image.slim
+                )
+            return self._runtimes[key]
+
+    def _build(
+        self, question_dir: Path
+    ) -> tuple[QuestionResult, Optional[DockerBuilder]]:
+        result = QuestionResult(path=str(question_dir))
+        start = time.perf_counter()
+        try:
+            config = CheckpointQuestion.from_yaml(question_dir / DEFAULT_CONFIG_PATH)
+            result.image = config.image.get_full_name()
+            builder = DockerBuilder(
+                config, base_dir=question_dir, runtime=self._runtime(config)
+            )
+            builder.build(result.image, force=self.force)
+            size = builder.image_size(result.image)
+            result.image_bytes = size.bytes
+            if size.over_budget:
+                assert size.budget_bytes is not None
+                raise ValueError(
+                    f"image is {size.bytes / 1e6:.1f} MB, over its size budget "
+                    f"of {size.budget_bytes / 1e6:.1f} MB"
+                )
+        except Exception as e:
+            result.status = "failed"
+            result.error = f"build: {e}"
+            return result, None
+        finally:
+            result.build_seconds = time.perf_counter() - start
+        result.runtime_source = builder.runtime_source
+        result.builds = builder.build_reports
+        result.status = "reused" if builder.reused else "built"
+        return result, builder
+
+    def _push(self, result: QuestionResult, builder: DockerBuilder) -> QuestionResult:
+        start = time.perf_counter()
+        try:
+            for report in builder.push(result.image):
+                result.uploaded_bytes += sum(layer.bytes for layer in report.uploaded)
+            QuestionBuilder(builder.config, base_dir=builder.base_dir).build(
+                result.image
+            )
+            result.status = "deployed"
+        except Exception as e:
+            result.status = "failed"
+            result.error = f"push: {e}"
+        finally:
+            result.push_seconds = time.perf_counter() - start
+        return result
@@ -1,9 +1,12 @@
 from enum import Enum
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional, Union
 
 import yaml
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
+
+from ..builders.templates.missions import resolve_dependencies, workspace_path
+from ..recording import RECORDING_PATH
 
 
 class RuntimeConfig(BaseModel):
@@ -13,8 +16,26 @@ class RuntimeConfig(BaseModel):
     program_args: list[str] = Field(default_factory=list)
     packages: list[str] = Field(default_factory=list)
     setup_commands: list[str] = Field(default_factory=list)
+    # Run once at image build time, in a copy of workspaceTemplates; the files
+    # they create are copied into each student's workspace at startup
+    build_commands: list[str] = Field(default_factory=list)
     workdir: str = "/app"
     user: str = "student"
+    # Also record every session event to .checkpoint/session.jsonl.gz
+    record_session: bool = False
+    # Terminals started ahead of time, and seconds an unused one is kept
+    terminal_pool_size: int = Field(default=0, ge=0)
+    terminal_pool_idle_timeout: float = Field(default=600, ge=0)
+    # Read commands and output boundaries from prompt marks the program
+    # writes, instead of from keystrokes (bash and gdb only)
+    shell_integration: bool = False
+
+    @model_validator(mode="after")
+    def check_shell_integration(self) -> "RuntimeConfig":
+        program = Path(self.program).name
+        if self.shell_integration and program not in ("bash", "gdb"):
+            raise ValueError("shell_integration supports bash and gdb programs")
+        return self
 
 
 class ImageConfig(BaseModel):
@@ -23,6 +44,12 @@ class ImageConfig(BaseModel):
     registry: str
     name: str
     base: str = "python:3.11-slim"
+    # Multi-stage runtime without pip, apt recommends or package caches. With
+    # build_commands, libc6-dev is added to the packages for compilers; other
+    # recommended packages a build needs must be listed in `packages`
+    slim: bool = False
+    # Fail the build when the image is larger than this
+    size_budget_mb: Optional[float] = Field(default=None, gt=0)
 
     def get_full_name(self) -> str:
         return f"{self.registry}/checkpoint-{self.name}"
@@ -37,17 +64,61 @@ class CheckpointFile(BaseModel):
 class ListenerType(str, Enum):
     REGEX = "regex"
     EXACT = "exact"
+    # Literal strings: one anywhere, all in any order, or all in this order
+    CONTAINS = "contains"
+    ALL_OF = "all_of"
+    SEQUENCE = "sequence"
+    # Any of several regexes
+    ANY_OF = "any_of"
+    # SHA-256 of a whole file, for the file target
+    HASH = "hash"
+
+
+# Listener types whose `match` is a list rather than a single string
+LIST_LISTENER_TYPES = (ListenerType.ALL_OF, ListenerType.SEQUENCE, ListenerType.ANY_OF)
 
 
 class ListenerTarget(str, Enum):
     COMMAND = "command"
     OUTPUT = "output"
+    # A file in the workspace, checked whenever it is written
+    FILE = "file"
 
 
 class CheckpointListener(BaseModel):
     type: ListenerType
     target: ListenerTarget
-    match: str
+    match: Union[str, list[str]]
+    # File of the file target, relative to the workspace
+    path: Optional[str] = None
+    # Per-match time budget in seconds and input cap in characters; the
+    # server's defaults apply when unset
+    timeout: Optional[float] = Field(default=None, gt=0)
+    max_input: Optional[int] = Field(default=None, gt=0)
+
+    @model_validator(mode="after")
+    def check_match(self) -> "CheckpointListener":
+        if self.type in LIST_LISTENER_TYPES:
+            if isinstance(self.match, str) or not self.match or not all(self.match):
+                raise ValueError(
+                    f"{self.type.value} listeners match a list of non-empty strings"
+                )
+        elif not isinstance(self.match, str):
+            raise ValueError(f"{self.type.value} listeners match a single string")
+        if self.target == ListenerTarget.FILE:
+            self.path = workspace_path(self.path)
+        elif self.path is not None:
+            raise ValueError("only file listeners have a path")
+        if self.type == ListenerType.HASH and self.target != ListenerTarget.FILE:
+            raise ValueError("hash listeners need the file target")
+        return self
+
+
+class CheckpointSamples(BaseModel):
+    """Sample files the listener must accept (positive) or reject (negative)"""
+
+    positive: list[str] = Field(default_factory=list)
+    negative: list[str] = Field(default_factory=list)
 
 
 class CheckpointFlag(BaseModel):
@@ -56,6 +127,10 @@ class CheckpointFlag(BaseModel):
     description: str
     listener: CheckpointListener
     files: list[CheckpointFile] = Field(default_factory=list)
+    samples: CheckpointSamples = Field(default_factory=CheckpointSamples)
+    # Mission numbers (1-based) to complete before this one unlocks; unset
+    # means the previous mission, [] means unlocked from the start
+    depends_on: Optional[list[int]] = None
 
 
 class CheckpointQuestion(BaseModel):
@@ -69,6 +144,11 @@ class CheckpointQuestion(BaseModel):
     workspace_port: int = 8080
     workspace_home: str = "/home/student"
 
+    @model_validator(mode="after")
+    def check_dependencies(self) -> "CheckpointQuestion":
+        resolve_dependencies([flag.depends_on for flag in self.flags])
+        return self
+
     @classmethod
     def from_yaml(cls, path: Path) -> "CheckpointQuestion":
         with open(path) as f:
@@ -127,6 +207,8 @@ PROGRAM_COMMAND = {[self.runtime.program] + self.runtime.program_args}
             ".checkpoint/server.log",
             ".checkpoint/session.log",
         }
+        if self.runtime.record_session:
+            graded_files.add(RECORDING_PATH.as_posix())
         for flag in self.flags:
             for file in flag.files:
                 if file.graded:
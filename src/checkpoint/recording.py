@@ -0,0 +1,30 @@
+"""Reading structured session recordings written by the container server"""
+
+import gzip
+import json
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+# Location of the recording inside the student's workspace
+RECORDING_PATH = Path(".checkpoint/session.jsonl.gz")
+
+EVENT_KINDS = ("stdin", "command", "output", "file", "mission_complete")
+
+
+def read_recording(path: Path) -> Iterator[dict[str, Any]]:
+    """Yield the events of a recording in order.
+
+    Each event has ``t`` (seconds since the server started), ``kind`` (one of
+    EVENT_KINDS), ``mission`` (index of the current or, for mission_complete,
+    the completed mission) and, except for mission_complete, ``data``; the
+    data of a file event is the path of the changed file, not its content. A
+    recording cut short by a killed container yields every complete batch.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                if line.endswith("\n"):
+                    yield json.loads(line)
+        except EOFError:
+            return
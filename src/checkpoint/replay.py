@@ -0,0 +1,233 @@
+"""Offline replay of recorded sessions against a question's mission listeners"""
+
+import os
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Optional
+
+import regex
+from pydantic import BaseModel
+
+from .builders.templates.missions import (
+    ListenerMatcher,
+    MissionTracker,
+    compile_listeners,
+)
+from .models.question import CheckpointQuestion
+from .recording import RECORDING_PATH, read_recording
+
+SESSION_LOG_NAME = "session.log"
+
+# A session.log record starts with its timestamp; any other line continues the
+# message of the previous record (multi-line program output)
+LOG_RECORD = regex.compile(r"\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} - (.*)")
+LOG_EVENTS = {"User Command: ": "command", "Program Output: ": "output"}
+
+
+class SessionEvent(BaseModel):
+    kind: str  # 'command', 'output' or, from recordings, 'mission_complete'
+    content: str
+    location: str  # Where the event was recorded, e.g. "line 12" or "t=4.455s"
+
+
+class MissionCompletion(BaseModel):
+    mission: int  # 1-based, as shown to students
+    title: str
+    event: int  # 1-based index into the session's events
+    location: str
+    recorded: bool = False  # Taken from the recording instead of re-checked
+
+
+class ReplayResult(BaseModel):
+    path: str
+    events: int = 0
+    completed: list[MissionCompletion] = []
+    # Incomplete missions (1-based) the session cannot decide: file missions,
+    # which a session.log has no events for, and the missions after them
+    unverifiable: list[int] = []
+    error: Optional[str] = None
+
+
+def question_missions(config: CheckpointQuestion) -> list[dict[str, Any]]:
+    """Missions in the shape of the generated config.py"""
+    return [
+        {
+            "title": flag.title,
+            "depends_on": flag.depends_on,
+            "listener": {
+                "type": flag.listener.type.value,
+                "target": flag.listener.target.value,
+                "match": flag.listener.match,
+                "path": flag.listener.path,
+                "timeout": flag.listener.timeout,
+                "max_input": flag.listener.max_input,
+            },
+        }
+        for flag in config.flags
+    ]
+
+
+def parse_session_log(path: Path) -> Iterator[SessionEvent]:
+    """Rebuild the command and output events written to a session.log"""
+    kind: Optional[str] = None
+    lines: list[str] = []
+    start = 0
+
+    def flush() -> Iterator[SessionEvent]:
+        if kind is not None:
+            yield SessionEvent(
+                kind=kind, content="\n".join(lines), location=f"line {start}"
+            )
+
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for number, line in enumerate(f, 1):
+            line = line[:-1] if line.endswith("\n") else line
+            record = LOG_RECORD.fullmatch(line)
+            if record is None:
+                lines.append(line)
+                continue
+
+            yield from flush()
+            kind, message = None, record.group(1)
+            for prefix, event_kind in LOG_EVENTS.items():
+                if message.startswith(prefix):
+                    kind, lines, start = event_kind, [message[len(prefix) :]], number
+                    break
+    yield from flush()
+
+
+def is_recording(path: Path) -> bool:
+    return path.name.endswith(".jsonl.gz")
+
+
+def read_session(path: Path) -> Iterator[SessionEvent]:
+    """Read the command and output events of a session.log or a recording.
+
+    Recordings also yield their mission completions, with the 0-based index
+    of the mission as content: file events only record the path, so these
+    are the only way to replay file missions.
+    """
+    if is_recording(path):
+        for event in read_recording(path):
+            if event["kind"] in ("command", "output"):
+                content = event["data"]
+            elif event["kind"] == "mission_complete":
+                content = str(event["mission"])
+            else:
+                continue
+            yield SessionEvent(
+                kind=event["kind"], content=content, location=f"t={event['t']:.3f}s"
+            )
+    else:
+        yield from parse_session_log(path)
+
+
+def unverifiable_missions(
+    listeners: list[ListenerMatcher], completed: Iterable[int]
+) -> list[int]:
+    """Incomplete missions (0-based) that are file missions or depend on one,
+    directly or through other incomplete missions"""
+    done = set(completed)
+    blocked: dict[int, bool] = {}
+
+    def is_blocked(index: int) -> bool:
+        if index not in blocked:
+            listener = listeners[index]
+            blocked[index] = index not in done and (
+                listener.target == "file"
+                or any(is_blocked(d) for d in listener.depends_on)
+            )
+        return blocked[index]
+
+    return [index for index in range(len(listeners)) if is_blocked(index)]
+
+
+def find_sessions(paths: Iterable[Path]) -> list[Path]:
+    """Expand directories into the sessions they contain.
+
+    A directory is searched recursively for session.log files and recordings;
+    where a .checkpoint directory has both, only the recording is used.
+    """
+    found: list[Path] = []
+    for path in paths:
+        if not path.is_dir():
+            found.append(path)
+            continue
+        for log in sorted(path.rglob(SESSION_LOG_NAME)):
+            recording = log.with_name(RECORDING_PATH.name)
+            found.append(recording if recording.exists() else log)
+        for recording in sorted(path.rglob(f"*{RECORDING_PATH.name}")):
+            if not recording.with_name(SESSION_LOG_NAME).exists():
+                found.append(recording)
+    return found
+
+
+def replay_session(
+    path: Path, missions: list[dict[str, Any]], listeners: list[ListenerMatcher]
+) -> ReplayResult:
+    """Run a recorded session through the mission state machine of the server"""
+    result = ReplayResult(path=str(path))
+    tracker = MissionTracker(listeners)
+    try:
+        for index, event in enumerate(read_session(path), 1):
+            result.events = index
+            if event.kind == "mission_complete":
+                # Only file missions cannot be re-checked from their events
+                mission = int(event.content)
+                target = missions[mission]["listener"]["target"]
+                recorded = target == "file" and tracker.complete(mission)
+                completed = [mission] if recorded else []
+            else:
+                recorded = False
+                completed = tracker.check(event.kind, event.content)
+            for mission in completed:
+                result.completed.append(
+                    MissionCompletion(
+                        mission=mission + 1,
+                        title=missions[mission]["title"],
+                        event=index,
+                        location=event.location,
+                        recorded=recorded,
+                    )
+                )
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    if not is_recording(path):
+        result.unverifiable = [
+            index + 1 for index in unverifiable_missions(listeners, tracker.completed)
+        ]
+    return result
+
+
+# Listeners compiled once per worker process
+_worker_missions: list[dict[str, Any]] = []
+_worker_listeners: list[ListenerMatcher] = []
+
+
+def _init_worker(missions: list[dict[str, Any]]) -> None:
+    global _worker_missions, _worker_listeners
+    _worker_missions = missions
+    _worker_listeners = compile_listeners(missions)
+
+
+def _replay_in_worker(path: Path) -> ReplayResult:
+    return replay_session(path, _worker_missions, _worker_listeners)
+
+
+def replay_sessions(
+    paths: list[Path], missions: list[dict[str, Any]], jobs: Optional[int] = None
+) -> Iterator[ReplayResult]:
+    """Replay many sessions, in input order, across a pool of processes"""
+    jobs = min(jobs or os.cpu_count() or 1, len(paths))
+    if jobs <= 1:
+        listeners = compile_listeners(missions)
+        for path in paths:
+            yield replay_session(path, missions, listeners)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(missions,)
+    ) as pool:
+        chunksize = max(1, len(paths) // (jobs * 4))
+        yield from pool.map(_replay_in_worker, paths, chunksize=chunksize)
@@ -0,0 +1,85 @@
+"""Batch validation of mission listeners against sample files"""
+
+import time
+from pathlib import Path
+from typing import Optional
+
+from pydantic import BaseModel
+
+from .builders.templates.missions import ListenerMatcher, RegexMatcher
+from .constants import SAMPLES_PATH
+from .models.question import CheckpointFlag
+
+SAMPLE_KINDS = ("positive", "negative")
+
+
+class SampleResult(BaseModel):
+    path: str
+    kind: str  # 'positive' (must match) or 'negative' (must not match)
+    matched: bool
+    seconds: float
+    partial: Optional[str] = None  # Text a failing positive sample matched so far
+    timed_out: bool = False
+
+    @property
+    def passed(self) -> bool:
+        return self.matched == (self.kind == "positive")
+
+
+def find_samples(
+    flag: CheckpointFlag, mission_number: int, base_dir: Path
+) -> list[tuple[str, Path]]:
+    """Samples declared in checkpoint.yaml plus those under samples/<number>/"""
+    samples: list[tuple[str, Path]] = []
+    for kind in SAMPLE_KINDS:
+        declared = [base_dir / path for path in getattr(flag.samples, kind)]
+        sample_dir = base_dir / SAMPLES_PATH / str(mission_number) / kind
+        found = sorted(p for p in sample_dir.glob("*") if p.is_file())
+        samples.extend((kind, path) for path in dict.fromkeys(declared + found))
+    return samples
+
+
+def check_sample(listener: ListenerMatcher, kind: str, path: Path) -> SampleResult:
+    """Match one sample exactly as the server matches an event"""
+    if listener.target == "file":
+        # Byte for byte, as the server reads a changed workspace file
+        content = path.read_bytes().decode("utf-8", "surrogateescape")
+    else:
+        content = path.read_text()
+    timeouts = listener.timeouts
+    start = time.perf_counter()
+    if listener.target == "file":
+        matched = listener.match_file(content)
+    else:
+        matched = listener.match(content)
+    seconds = time.perf_counter() - start
+    timed_out = listener.timeouts > timeouts
+
+    partial = None
+    if (
+        kind == "positive"
+        and not matched
+        and not timed_out
+        and isinstance(listener, RegexMatcher)
+    ):
+        m = listener.search(content[-listener.max_input :], partial=True)
+        if m is not None and m.partial and m.group():
+            partial = m.group()
+    return SampleResult(
+        path=str(path),
+        kind=kind,
+        matched=matched,
+        seconds=seconds,
+        partial=partial,
+        timed_out=timed_out,
+    )
+
+
+def validate_flag(
+    flag: CheckpointFlag, mission_number: int, listener: ListenerMatcher, base_dir: Path
+) -> list[SampleResult]:
+    """Check every sample of a flag against its compiled listener"""
+    return [
+        check_sample(listener, kind, path)
+        for kind, path in find_samples(flag, mission_number, base_dir)
+    ]
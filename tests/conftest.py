@@ -0,0 +1,61 @@
+import importlib
+import sys
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Callable
+
+import pytest
+
+from checkpoint.builders.docker import render_config
+from checkpoint.models.question import CheckpointQuestion
+
+ROOT = Path(__file__).resolve().parent.parent
+TEMPLATES_DIR = ROOT / "src" / "checkpoint" / "builders" / "templates"
+
+
+def listener_flag(match: Any, **listener: Any) -> dict[str, Any]:
+    """A flag dict whose listener matches `match` (output regex by default)"""
+    return {
+        "title": "Mission",
+        "prompt": "Mission",
+        "description": "Do it",
+        "listener": {"type": "regex", "target": "output", "match": match, **listener},
+    }
+
+
+@pytest.fixture
+def make_question() -> Callable[..., CheckpointQuestion]:
+    """Build a minimal question from flag dicts and optional runtime settings"""
+
+    def make(flags: list[dict[str, Any]], **runtime: Any) -> CheckpointQuestion:
+        return CheckpointQuestion.model_validate(
+            {
+                "uuid": "00000000-0000-0000-0000-000000000000",
+                "title": "Test question",
+                "topic": "Tests",
+                "image": {"registry": "local", "name": "test"},
+                "runtime": runtime,
+                "flags": flags,
+            }
+        )
+
+    return make
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory: pytest.TempPathFactory) -> ModuleType:
+    """The container server, imported with the config.py of a one-flag question"""
+    question = CheckpointQuestion.model_validate(
+        {
+            "uuid": "00000000-0000-0000-0000-000000000000",
+            "title": "Test question",
+            "topic": "Tests",
+            "image": {"registry": "local", "name": "test"},
+            "runtime": {},
+            "flags": [listener_flag("done")],
+        }
+    )
+    config_dir = tmp_path_factory.mktemp("config")
+    (config_dir / "config.py").write_text(render_config(question))
+    sys.path[:0] = [str(config_dir), str(TEMPLATES_DIR)]
+    return importlib.import_module("server")
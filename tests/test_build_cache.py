@@ -0,0 +1,89 @@
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable
+
+import pytest
+from conftest import listener_flag
+
+from checkpoint.builders import docker as builders
+from checkpoint.builders.docker import BuildManifest, DockerBuilder, context_digest
+from checkpoint.constants import WORKSPACE_TEMPLATES_PATH
+
+
+class FakeImages:
+    def __init__(self) -> None:
+        self.images: dict[str, Any] = {}
+
+    def get(self, image_id: str) -> Any:
+        if image_id not in self.images:
+            raise builders.docker.errors.ImageNotFound(image_id)
+        return self.images[image_id]
+
+
+@pytest.fixture
+def make_builder(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, make_question: Callable[..., Any]
+) -> Callable[..., DockerBuilder]:
+    client = SimpleNamespace(images=FakeImages())
+    monkeypatch.setattr(builders.docker, "from_env", lambda: client)
+    runtime = SimpleNamespace(tag="runtime:1", ensure=lambda progress: "present")
+
+    def make(match: str = "done", **runtime_config: Any) -> DockerBuilder:
+        question = make_question([listener_flag(match)], **runtime_config)
+        builder = DockerBuilder(question, tmp_path, runtime=runtime)  # type: ignore[arg-type]
+        builder.manifest = BuildManifest(tmp_path / "builds.json")
+        return builder
+
+    return make
+
+
+def digest(builder: DockerBuilder) -> str:
+    return context_digest(builder.build_context())
+
+
+def test_context_digest_covers_names_modes_and_contents() -> None:
+    context = {"a": (b"1", 0o644), "b": (b"2", 0o644)}
+    assert context_digest(context) == context_digest(dict(reversed(context.items())))
+    assert context_digest(context) != context_digest({**context, "a": (b"1", 0o755)})
+    assert context_digest(context) != context_digest({**context, "a": (b"3", 0o644)})
+    assert context_digest({"ab": (b"", 0o644)}) != context_digest({"a": (b"b", 0o644)})
+
+
+def test_digest_follows_the_question(
+    tmp_path: Path, make_builder: Callable[..., DockerBuilder]
+) -> None:
+    assert digest(make_builder()) == digest(make_builder())
+    assert digest(make_builder()) != digest(make_builder("other"))
+
+    templates = tmp_path / WORKSPACE_TEMPLATES_PATH
+    templates.mkdir()
+    (templates / "main.c").write_text("int main;")
+    # Templates are only in the context when build_commands use them
+    assert digest(make_builder()) == digest(make_builder())
+    built = digest(make_builder(build_commands=["make"]))
+    (templates / "main.c").write_text("int main(void);")
+    assert digest(make_builder(build_commands=["make"])) != built
+
+
+def test_manifest_records_and_survives_corruption(tmp_path: Path) -> None:
+    manifest = BuildManifest(tmp_path / "cache" / "builds.json")
+    assert manifest.get("abc") is None
+    manifest.record("abc", "sha256:1", "me/checkpoint-q")
+    assert manifest.get("abc") == "sha256:1"
+    manifest.path.write_text("{not json")
+    assert manifest.get("abc") is None
+
+
+def test_build_reuses_the_recorded_image(
+    make_builder: Callable[..., DockerBuilder],
+) -> None:
+    builder = make_builder()
+    image = SimpleNamespace(tags=["me/checkpoint-q:latest"], tag=None)
+    builder.manifest.record(digest(builder), "sha256:1", "me/checkpoint-q")
+    builder.client.images.images["sha256:1"] = image
+    assert builder.build("me/checkpoint-q") == "sha256:1"
+    assert builder.reused
+
+    # An image deleted since is not reused
+    del builder.client.images.images["sha256:1"]
+    assert builder._reuse_image(digest(builder), "me/checkpoint-q") is None
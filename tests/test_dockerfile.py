@@ -0,0 +1,32 @@
+from typing import Any
+
+from checkpoint.builders.docker import _render_dockerfile
+
+
+def render(**options: Any) -> str:
+    return _render_dockerfile(
+        "Dockerfile.j2",
+        runtime_image="runtime",
+        packages=["gcc"],
+        prebuilt_workspace_dir="/opt/prebuilt",
+        user="student",
+        port=8080,
+        workspace_home="/home/student",
+        **options,
+    )
+
+
+def test_slim_build_installs_c_headers() -> None:
+    dockerfile = render(slim=True, build_commands=["gcc -o main main.c"])
+    assert "--no-install-recommends gcc libc6-dev &&" in dockerfile
+    assert "libc6-dev" not in render(slim=True, build_commands=[])
+    assert "libc6-dev" not in render(slim=False, build_commands=["make"])
+
+
+def test_build_runs_without_home_directory_files() -> None:
+    dockerfile = render(slim=False, build_commands=["make"])
+    # The home directory useradd created is moved aside during the build
+    assert "mv /home/student /tmp/checkpoint-home" in dockerfile
+    assert dockerfile.index("mv /tmp/checkpoint-workspace /home/student") < (
+        dockerfile.index("make &&")
+    )
@@ -0,0 +1,41 @@
+import logging
+from pathlib import Path
+from types import ModuleType
+
+
+def write_records(server: ModuleType, path: Path, count: int) -> object:
+    handler = server.CappedFileHandler(path, 400)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    for i in range(count):
+        handler.emit(logging.makeLogRecord({"msg": f"record {i:03}"}))
+    return handler
+
+
+def test_small_log_is_written_unchanged(server: ModuleType, tmp_path: Path) -> None:
+    handler = write_records(server, tmp_path / "session.log", 5)
+    handler.close()
+    lines = (tmp_path / "session.log").read_text().splitlines()
+    assert lines == [f"record {i:03}" for i in range(5)]
+
+
+def test_keeps_head_and_latest_records(server: ModuleType, tmp_path: Path) -> None:
+    path = tmp_path / "session.log"
+    handler = write_records(server, path, 100)
+    assert handler.dropped_records > 0
+    handler.close()
+
+    lines = path.read_text().splitlines()
+    assert lines[0] == "record 000"
+    assert lines[-1] == "record 099"
+    assert f"[{handler.dropped_records} records" in path.read_text()
+    kept = [line for line in lines if line.startswith("record")]
+    assert len(kept) + handler.dropped_records == 100
+    assert path.stat().st_size <= 400 + 200
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_tail_survives_without_close(server: ModuleType, tmp_path: Path) -> None:
+    path = tmp_path / "session.log"
+    write_records(server, path, 100)
+    tail = Path(f"{path}.tail").read_text().splitlines()
+    assert tail[-1] == "record 099"
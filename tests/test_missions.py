@@ -0,0 +1,227 @@
+import hashlib
+from typing import Any
+
+import pytest
+
+from checkpoint.builders.templates.missions import (
+    STREAM_CONTEXT,
+    ListenerMatcher,
+    MissionTracker,
+    StreamState,
+    compile_listeners,
+    resolve_dependencies,
+)
+
+
+def listener(match: Any, type: str = "regex", **fields: Any) -> Any:
+    missions = [
+        {"listener": {"type": type, "target": "output", "match": match, **fields}}
+    ]
+    return compile_listeners(missions)[0]
+
+
+def feed_all(matcher: Any, chunks: list[str]) -> list[bool]:
+    state = StreamState()
+    return [matcher.feed(state, chunk) for chunk in chunks]
+
+
+def test_exact_output_compares_each_chunk() -> None:
+    exact = listener("done", "exact")
+    assert feed_all(exact, ["xyz\n", "done\n"]) == [False, True]
+    assert feed_all(exact, ["xyz\ndone\n"]) == [False]
+    assert feed_all(exact, ["do", "ne"]) == [False, False]
+
+
+def test_listener_matcher_requires_match() -> None:
+    with pytest.raises(TypeError):
+        ListenerMatcher({"type": "regex", "target": "output", "match": "x"})
+
+
+def test_regex_matches_across_chunks() -> None:
+    regex_listener = listener(r"Breakpoint \d+, main")
+    assert feed_all(regex_listener, ["Breakpoint ", "1, ma", "in ()"]) == [
+        False,
+        False,
+        True,
+    ]
+
+
+def test_regex_carries_only_pending_partial_match() -> None:
+    regex_listener = listener(r"exit code \d+")
+    state = StreamState()
+    assert not regex_listener.feed(state, "x" * 10000 + " exit co")
+    assert state.carry.endswith("exit co")
+    assert len(state.carry) <= STREAM_CONTEXT
+    assert regex_listener.feed(state, "de 3")
+
+
+def test_regex_keeps_context_for_anchors() -> None:
+    regex_listener = listener(r"(?m)^\$ done$")
+    assert feed_all(regex_listener, ["line\n", "$ done"]) == [False, True]
+
+
+def test_match_resets_state() -> None:
+    regex_listener = listener("ok")
+    state = StreamState()
+    assert regex_listener.feed(state, "ok")
+    assert state.carry == ""
+
+
+def test_regex_timeout_counts_as_no_match() -> None:
+    slow = listener(r"(a|aa)+$", timeout=0.001)
+    assert not slow.match("a" * 40 + "!")
+    assert slow.timeouts == 1
+
+
+def test_max_input_caps_what_is_matched() -> None:
+    assert not listener("start", max_input=10).match("start" + "x" * 20)
+    assert listener("end", max_input=10).match("x" * 20 + "end")
+    assert not listener("x" * 20, "exact", max_input=10).match("x" * 20)
+
+
+def test_contains_finds_literal_split_across_chunks() -> None:
+    contains = listener("a.out", "contains")
+    assert feed_all(contains, ["running ./a", ".out now"]) == [False, True]
+    # Regex characters are plain text
+    assert not contains.match("aXout")
+
+
+def test_all_of_matches_in_any_order() -> None:
+    all_of = listener(["Breakpoint 1", "main.c:6"], "all_of")
+    assert feed_all(all_of, ["at main.c:", "6\n", "Breakpoint 1"]) == [
+        False,
+        False,
+        True,
+    ]
+    state = StreamState()
+    assert not all_of.feed(state, "at main.c:6\n")
+    assert state.found == {1}
+    assert all_of.feed(state, "Breakpoint 1")
+
+
+def test_sequence_needs_order_without_overlap() -> None:
+    sequence = listener(["ab", "bc"], "sequence")
+    assert not sequence.match("abc")
+    assert sequence.match("ab bc")
+    assert not sequence.match("bc ab")
+    assert feed_all(sequence, ["a", "b b", "c"]) == [False, False, True]
+
+
+def test_any_of_matches_any_alternative() -> None:
+    any_of = listener([r"exit\s+0", "^ok$"], "any_of")
+    assert any_of.match("exit  0")
+    assert any_of.match("ok")
+    assert not any_of.match("not ok")
+
+
+def test_literal_listeners_reject_invalid_match() -> None:
+    for type, match in [("all_of", []), ("sequence", ["a", ""]), ("contains", 3)]:
+        with pytest.raises(ValueError, match=type):
+            listener(match, type)
+    with pytest.raises(ValueError, match="mission 1"):
+        listener(["ok", "("], "any_of")
+
+
+def tracker(*missions: dict[str, Any]) -> MissionTracker:
+    return MissionTracker(compile_listeners(list(missions)))
+
+
+def mission(match: str, target: str = "command", **fields: Any) -> dict[str, Any]:
+    return {"listener": {"type": "exact", "target": target, "match": match}, **fields}
+
+
+def test_missions_without_depends_on_run_in_order() -> None:
+    missions = tracker(mission("a"), mission("b"))
+    assert missions.frontier["command"] == [0]
+    assert missions.check("command", "b") == []
+    assert missions.check("command", "a") == [0]
+    assert missions.unlocked_by(0) == [1]
+    assert missions.check("command", "b") == [1]
+    assert missions.completed == [0, 1]
+
+
+def test_frontier_follows_the_dependency_graph() -> None:
+    missions = tracker(
+        mission("a", depends_on=[]),
+        mission("b", depends_on=[]),
+        mission("c", depends_on=[1, 2]),
+    )
+    assert missions.unlocked == [0, 1]
+    assert missions.check("command", "b") == [1]
+    assert missions.unlocked_by(1) == []
+    assert missions.check("command", "c") == []
+    assert missions.check("command", "a") == [0]
+    assert missions.unlocked_by(0) == [2]
+    assert missions.unlocked == [2]
+    assert missions.check("command", "c") == [2]
+    assert missions.current_mission == 3
+
+
+def test_events_only_check_missions_of_their_target() -> None:
+    missions = tracker(
+        mission("a", depends_on=[]), mission("a", target="output", depends_on=[])
+    )
+    assert missions.check("output", "a") == [1]
+    assert missions.check("command", "a") == [0]
+
+
+def test_command_resets_output_streams() -> None:
+    missions = tracker(
+        {"listener": {"type": "sequence", "target": "output", "match": ["x", "y"]}}
+    )
+    assert missions.check("output", "x") == []
+    missions.check("command", "ls")
+    assert missions.check("output", "y") == []
+
+
+def test_resolve_dependencies() -> None:
+    assert resolve_dependencies([None, None, [1], []]) == [[], [0], [0], []]
+    with pytest.raises(ValueError, match="invalid mission 3"):
+        resolve_dependencies([[3], None])
+    with pytest.raises(ValueError, match="invalid mission 1"):
+        resolve_dependencies([[1]])
+    with pytest.raises(ValueError, match=r"Missions \[1, 2, 3\] .* cycle"):
+        resolve_dependencies([[3], None, None, []])
+
+
+def test_file_events_only_check_their_path() -> None:
+    digest = hashlib.sha256(b"\xffok\n").hexdigest()
+    missions = tracker(
+        {
+            "listener": {
+                "type": "hash",
+                "target": "file",
+                "match": digest.upper(),
+                "path": "./out/result.bin",
+            }
+        }
+    )
+    content = b"\xffok\n".decode("utf-8", "surrogateescape")
+    assert missions.listeners[0].path == "out/result.bin"
+    assert missions.check("file", content, "other.bin") == []
+    assert missions.check("file", "wrong", "out/result.bin") == []
+    assert missions.check("file", content, "out/result.bin") == [0]
+
+
+def test_file_listener_paths_stay_in_the_workspace() -> None:
+    file_mission = mission("x", target="file")
+    file_mission["listener"]["path"] = "src/../main.c"
+    assert tracker(file_mission).listeners[0].path == "main.c"
+    for path in ["../secret", "/etc/passwd", "", None]:
+        file_mission["listener"]["path"] = path
+        with pytest.raises(ValueError, match="mission 1"):
+            tracker(file_mission)
+
+
+def test_file_over_max_input_bytes_never_matches() -> None:
+    file_mission = mission("x", target="file")
+    file_mission["listener"].update(type="contains", path="out.txt", max_input=4)
+    missions = tracker(file_mission)
+    # max_input + 1 bytes, as WorkspaceWatcher reads a longer file
+    assert missions.check("file", "abcx", "out.txt") == [0]
+    assert tracker(file_mission).check("file", "abcdx", "out.txt") == []
+    # Characters are not bytes: "é" is two
+    assert tracker(file_mission).check("file", "éabx", "out.txt") == []
+    digest = hashlib.sha256(b"abcde").hexdigest()
+    file_mission["listener"].update(type="hash", match=digest)
+    assert tracker(file_mission).check("file", "abcde", "out.txt") == []
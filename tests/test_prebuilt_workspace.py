@@ -0,0 +1,45 @@
+from pathlib import Path
+from types import ModuleType
+
+import pytest
+
+
+@pytest.fixture
+def prebuilt(
+    server: ModuleType, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> Path:
+    prebuilt = tmp_path / "prebuilt"
+    (prebuilt / "build" / "obj").mkdir(parents=True)
+    (prebuilt / "main").write_text("binary")
+    (prebuilt / "build" / "main.o").write_text("object")
+    (prebuilt / "build" / "obj" / "util.o").write_text("object")
+    monkeypatch.setattr(server, "PREBUILT_WORKSPACE_DIR", prebuilt)
+    return prebuilt
+
+
+def test_copies_missing_files_only(
+    server: ModuleType, prebuilt: Path, tmp_path: Path
+) -> None:
+    workdir = tmp_path / "workspace"
+    workdir.mkdir()
+    (workdir / "main").write_text("rebuilt")
+    assert server.copy_prebuilt_workspace(str(workdir)) == 2
+    assert (workdir / "main").read_text() == "rebuilt"
+    assert (workdir / "build" / "obj" / "util.o").read_text() == "object"
+
+
+def test_skips_directories_replaced_by_symlinks_or_files(
+    server: ModuleType, prebuilt: Path, tmp_path: Path
+) -> None:
+    outside = tmp_path / "etc"
+    outside.mkdir()
+    workdir = tmp_path / "workspace"
+    workdir.mkdir()
+    (workdir / "build").symlink_to(outside)
+    assert server.copy_prebuilt_workspace(str(workdir)) == 1
+    assert list(outside.iterdir()) == []
+    assert (workdir / "main").read_text() == "binary"
+
+    (workdir / "build").unlink()
+    (workdir / "build").write_text("not a directory")
+    assert server.copy_prebuilt_workspace(str(workdir)) == 0
@@ -0,0 +1,73 @@
+from types import ModuleType
+
+A, B, D = "\x1b]133;A\x07", "\x1b]133;B\x07", "\x1b]133;D\x07"
+
+
+def C(line: str) -> str:
+    return f"\x1b]133;C;{line}\x07"
+
+
+def E(line: str) -> str:
+    return f"\x1b]133;E;{line}\x07"
+
+
+def feed(server: ModuleType, chunks: list[str]) -> list[tuple[str, str]]:
+    markers = server.PromptMarkers()
+    return [event for chunk in chunks for event in markers.feed(chunk)]
+
+
+def test_bash_marks(server: ModuleType) -> None:
+    events = feed(
+        server,
+        [
+            "welcome\r\n",
+            f"{D}{A}$ {B}",
+            "git status\r\n",
+            f"{C('git status')}On branch main\r\n",
+            f"\x1b]133;D;0\x07{A}$ {B}",
+        ],
+    )
+    assert events == [
+        ("output", "welcome\r\n"),
+        ("command", "git status"),
+        ("output", "On branch main\r\n"),
+    ]
+
+
+def test_gdb_marks_hold_output_until_e(server: ModuleType) -> None:
+    events = feed(
+        server,
+        [
+            f"{D}{A}(gdb) {B}",
+            "break main\r\nBreakpoint 1 at 0x1139\r\n",
+            f"{E('break main')}{D}{A}(gdb) {B}",
+        ],
+    )
+    assert events == [
+        ("command", "break main"),
+        ("output", "Breakpoint 1 at 0x1139\r\n"),
+    ]
+
+
+def test_mark_split_across_reads(server: ModuleType) -> None:
+    events = feed(server, [f"{D}{A}(gdb) {B}", "run\r\nok\r\n\x1b]13", "3;E;run\x07"])
+    assert events == [("command", "run"), ("output", "ok\r\n")]
+
+
+def test_completion_redraw_is_not_output(server: ModuleType) -> None:
+    # readline lists the completions and redraws the prompt and typed line
+    events = feed(
+        server,
+        [
+            f"{D}{A}(gdb) {B}",
+            "break ma",
+            "\r\nmain    malloc\r\n",
+            f"(gdb) {B}break ma",
+            "in\r\nBreakpoint 1 at 0x1139\r\n",
+            f"{E('break main')}{D}{A}(gdb) {B}",
+        ],
+    )
+    assert events == [
+        ("command", "break main"),
+        ("output", "Breakpoint 1 at 0x1139\r\n"),
+    ]
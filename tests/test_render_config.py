@@ -0,0 +1,48 @@
+from typing import Any, Callable
+
+from conftest import listener_flag
+
+from checkpoint.builders.docker import render_config
+from checkpoint.builders.templates.missions import compile_listeners
+
+
+def exec_config(source: str) -> dict[str, Any]:
+    namespace: dict[str, Any] = {}
+    exec(source, namespace)
+    return namespace
+
+
+def test_round_trips_non_bmp_characters(make_question: Callable[..., Any]) -> None:
+    flag = listener_flag("Done 🎉", type="contains")
+    flag["title"] = "Party 🎉"
+    config = exec_config(render_config(make_question([flag])))
+
+    mission = config["MISSIONS"][0]
+    assert mission["title"] == "Party 🎉"
+    assert mission["listener"]["match"] == "Done 🎉"
+    listener = compile_listeners(config["MISSIONS"])[0]
+    assert listener.match("All Done 🎉\n")
+
+
+def test_renders_python_literals(make_question: Callable[..., Any]) -> None:
+    flags = [
+        listener_flag(["a", "b"], type="all_of", timeout=0.5),
+        listener_flag("x", target="file", path="./notes/a.txt", max_input=10),
+    ]
+    flags[1]["depends_on"] = []
+    question = make_question(
+        flags, program="bash", program_args=["-c", 'echo "hi"'], record_session=True
+    )
+    config = exec_config(render_config(question))
+
+    first, second = (mission["listener"] for mission in config["MISSIONS"])
+    assert first["match"] == ["a", "b"]
+    assert first["path"] is None
+    assert first["timeout"] == 0.5
+    assert second["path"] == "notes/a.txt"
+    assert second["max_input"] == 10
+    assert config["MISSIONS"][0]["depends_on"] is None
+    assert config["MISSIONS"][1]["depends_on"] == []
+    assert config["PROGRAM_COMMAND"] == ["bash", "-c", 'echo "hi"']
+    assert config["RECORD_SESSION"] is True
+    assert config["SHELL_INTEGRATION"] is False
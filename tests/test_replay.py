@@ -0,0 +1,110 @@
+import gzip
+import json
+import shutil
+from pathlib import Path
+from typing import Any, Callable
+
+import pytest
+from click.testing import CliRunner
+from conftest import ROOT, listener_flag
+
+from checkpoint.builders.templates.missions import compile_listeners
+from checkpoint.cli import cli
+from checkpoint.replay import parse_session_log, question_missions, replay_session
+
+EXAMPLES_DIR = ROOT / "examples" / "questions"
+SESSION_LOG = """\
+2024-03-01 10:00:00 - === Session Started ===
+2024-03-01 10:00:01 - User Command: gcc -g main.c
+2024-03-01 10:00:02 - Program Output: main.c: In function 'main':
+main.c:3: warning: unused variable
+2024-03-01 10:00:03 - User Command: ./a.out
+2024-03-01 10:00:04 - Program Output: done
+"""
+
+
+@pytest.fixture
+def missions(make_question: Callable[..., Any]) -> list[dict[str, Any]]:
+    """An output mission, a file mission, and a mission that depends on both"""
+    return question_missions(
+        make_question(
+            [
+                listener_flag("done"),
+                {
+                    **listener_flag("ok", target="file", path="notes.txt"),
+                    "depends_on": [],
+                },
+                {**listener_flag("gdb", target="command"), "depends_on": [1, 2]},
+            ]
+        )
+    )
+
+
+def write_recording(path: Path, events: list[dict[str, Any]]) -> Path:
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for t, event in enumerate(events):
+            f.write(json.dumps({"t": float(t), "mission": 0, **event}) + "\n")
+    return path
+
+
+def test_parse_session_log_joins_continuation_lines(tmp_path: Path) -> None:
+    log = tmp_path / "session.log"
+    log.write_text(SESSION_LOG)
+    events = [(e.kind, e.content, e.location) for e in parse_session_log(log)]
+    assert events == [
+        ("command", "gcc -g main.c", "line 2"),
+        (
+            "output",
+            "main.c: In function 'main':\nmain.c:3: warning: unused variable",
+            "line 3",
+        ),
+        ("command", "./a.out", "line 5"),
+        ("output", "done", "line 6"),
+    ]
+
+
+def test_recorded_completion_replays_file_mission(
+    tmp_path: Path, missions: list[dict[str, Any]]
+) -> None:
+    recording = write_recording(
+        tmp_path / "session.jsonl.gz",
+        [
+            {"kind": "output", "data": "done\n"},
+            {"kind": "file", "data": "notes.txt"},
+            {"kind": "mission_complete", "mission": 1},
+            {"kind": "command", "data": "gdb ./a.out"},
+        ],
+    )
+    result = replay_session(recording, missions, compile_listeners(missions))
+    assert result.error is None
+    assert [(c.mission, c.recorded) for c in result.completed] == [
+        (1, False),
+        (2, True),
+        (3, False),
+    ]
+    assert result.unverifiable == []
+
+
+def test_session_log_reports_file_missions_unverifiable(
+    tmp_path: Path, missions: list[dict[str, Any]]
+) -> None:
+    log = tmp_path / "session.log"
+    log.write_text(SESSION_LOG)
+    result = replay_session(log, missions, compile_listeners(missions))
+    assert [c.mission for c in result.completed] == [1]
+    assert result.unverifiable == [2, 3]
+
+
+def test_cli_exits_non_zero_on_unreadable_session(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    shutil.copy(EXAMPLES_DIR / "gdb-tutorial" / "checkpoint.yaml", tmp_path)
+    (tmp_path / "good.log").write_text(SESSION_LOG)
+    (tmp_path / "bad.jsonl.gz").write_bytes(b"not gzip")
+    monkeypatch.chdir(tmp_path)
+
+    result = CliRunner().invoke(cli, ["replay", "good.log"])
+    assert result.exit_code == 0, result.output
+    result = CliRunner().invoke(cli, ["replay", "good.log", "bad.jsonl.gz"])
+    assert result.exit_code == 1
+    assert "1 sessions could not be read" in result.output
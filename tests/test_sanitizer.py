@@ -0,0 +1,43 @@
+import json
+from types import ModuleType
+
+import pytest
+from conftest import ROOT
+
+
+def clean(server: ModuleType, *chunks: str) -> str:
+    sanitizer = server.OutputSanitizer()
+    return "".join(sanitizer.feed(chunk) for chunk in chunks)
+
+
+@pytest.mark.parametrize(
+    "raw, expected",
+    [
+        ("\x1b[1;32mok\x1b[0m", "ok"),
+        ("\x1b]0;user@host: ~\x07$ ls", "$ ls"),
+        ("\x1b]8;;http://x\x1b\\link\x1b]8;;\x1b\\", "link"),
+        ("\x1bP1$r0m\x1b\\text", "text"),
+        ("\x1b[?2004hline\x1b(B", "line"),
+        ("a\r\nb\rc", "a\nb\nc"),
+        ("tab\tbell\x07nul\x00", "tab\tbellnul"),
+    ],
+)
+def test_strips_control_sequences(server: ModuleType, raw: str, expected: str) -> None:
+    assert clean(server, raw) == expected
+
+
+def test_holds_sequences_split_across_reads(server: ModuleType) -> None:
+    assert clean(server, "red \x1b[3", "1mtext") == "red text"
+    assert clean(server, "title\x1b]0;wi", "ndow\x07 done") == "title done"
+    sanitizer = server.OutputSanitizer()
+    assert sanitizer.feed("line\r") == "line"
+    assert sanitizer.feed("\nnext") == "\nnext"
+
+
+def test_any_split_gives_the_same_text(server: ModuleType) -> None:
+    frames = json.loads((ROOT / "benchmarks" / "data" / "gdb-session.json").read_text())
+    text = "".join(frames)[:20000]
+    expected = clean(server, text)
+    for size in (1, 7, 100, 4096):
+        chunks = [text[i : i + size] for i in range(0, len(text), size)]
+        assert clean(server, *chunks) == expected
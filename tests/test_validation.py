@@ -0,0 +1,80 @@
+from pathlib import Path
+from typing import Any, Callable
+
+from conftest import listener_flag
+
+from checkpoint.builders.templates.missions import compile_listeners
+from checkpoint.constants import SAMPLES_PATH
+from checkpoint.replay import question_missions
+from checkpoint.validation import check_sample, find_samples
+
+
+def compile_one(make_question: Callable[..., Any], flag: dict[str, Any]) -> Any:
+    question = make_question([flag])
+    return question.flags[0], compile_listeners(question_missions(question))[0]
+
+
+def write(path: Path, data: bytes) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def test_positive_and_negative_samples(
+    tmp_path: Path, make_question: Callable[..., Any]
+) -> None:
+    _, listener = compile_one(make_question, listener_flag(r"Breakpoint \d+"))
+    hit = write(tmp_path / "hit.txt", b"Breakpoint 1, main ()")
+    miss = write(tmp_path / "miss.txt", b"No symbol table")
+    assert check_sample(listener, "positive", hit).passed
+    assert check_sample(listener, "negative", miss).passed
+    assert not check_sample(listener, "negative", hit).passed
+    assert check_sample(listener, "positive", hit).partial is None
+
+
+def test_failing_positive_sample_shows_partial_match(
+    tmp_path: Path, make_question: Callable[..., Any]
+) -> None:
+    _, listener = compile_one(make_question, listener_flag(r"exit code 0\n"))
+    result = check_sample(
+        listener, "positive", write(tmp_path / "cut.txt", b"... exit co")
+    )
+    assert not result.passed
+    assert result.partial == "exit co"
+
+
+def test_timed_out_sample(tmp_path: Path, make_question: Callable[..., Any]) -> None:
+    _, listener = compile_one(make_question, listener_flag(r"(a|aa)+$", timeout=0.001))
+    result = check_sample(
+        listener, "positive", write(tmp_path / "slow.txt", b"a" * 40 + b"!")
+    )
+    assert result.timed_out
+    assert not result.matched
+    assert result.partial is None
+
+
+def test_file_samples_are_matched_byte_for_byte(
+    tmp_path: Path, make_question: Callable[..., Any]
+) -> None:
+    _, listener = compile_one(
+        make_question,
+        listener_flag("^ok\r\n$", target="file", path="status.txt"),
+    )
+    sample = write(tmp_path / "status.txt", b"ok\r\n")
+    assert check_sample(listener, "positive", sample).matched
+
+
+def test_find_samples_merges_declared_and_directory_samples(
+    tmp_path: Path, make_question: Callable[..., Any]
+) -> None:
+    flag = {**listener_flag("x"), "samples": {"positive": ["samples/1/positive/a"]}}
+    question_flag, _ = compile_one(make_question, flag)
+    positive = tmp_path / SAMPLES_PATH / "1" / "positive"
+    a = write(positive / "a", b"x")
+    b = write(positive / "b", b"x")
+    c = write(tmp_path / SAMPLES_PATH / "1" / "negative" / "c", b"y")
+    assert find_samples(question_flag, 1, tmp_path) == [
+        ("positive", a),
+        ("positive", b),
+        ("negative", c),
+    ]
@@ -0,0 +1,102 @@
+import asyncio
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import Optional
+
+import pytest
+from tornado.ioloop import IOLoop
+
+from checkpoint.builders.templates.watch import WorkspaceWatcher, open_inotify
+
+pytestmark = pytest.mark.skipif(open_inotify() is None, reason="needs inotify")
+
+
+class Changes:
+    """Runs a WorkspaceWatcher on its own IOLoop, collecting what it reports"""
+
+    def __init__(self, workdir: Path, limits: dict[str, int]) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.seen: list[tuple[str, str]] = []
+        self.watcher = WorkspaceWatcher(
+            str(workdir), limits, lambda *change: self.seen.append(change), 0.05
+        )
+        assert self.watcher.start()
+
+    def settle(self) -> list[tuple[str, str]]:
+        """Let pending events and debounce timeouts run, then take the changes"""
+        self.loop.run_until_complete(asyncio.sleep(0.2))
+        seen, self.seen = self.seen, []
+        return seen
+
+    def close(self) -> None:
+        IOLoop.current().close(all_fds=False)
+        self.loop.close()
+
+
+StartWatcher = Callable[[dict[str, int]], Changes]
+
+
+@pytest.fixture
+def changes(tmp_path: Path) -> Iterator[StartWatcher]:
+    def start(limits: dict[str, int]) -> Changes:
+        nonlocal watching
+        watching = Changes(tmp_path, limits)
+        return watching
+
+    watching: Optional[Changes] = None
+    yield start
+    if watching is not None:
+        watching.close()
+
+
+def test_debounces_and_skips_unchanged_content(
+    tmp_path: Path, changes: StartWatcher
+) -> None:
+    watch = changes({"notes.txt": 100})
+    notes = tmp_path / "notes.txt"
+    notes.write_text("draft")
+    notes.write_text("final")
+    assert watch.settle() == [("notes.txt", "final")]
+    notes.write_text("final")
+    assert watch.settle() == []
+    (tmp_path / "other.txt").write_text("ignored")
+    assert watch.settle() == []
+
+
+def test_watches_directories_created_later(
+    tmp_path: Path, changes: StartWatcher
+) -> None:
+    watch = changes({"src/a/main.c": 100})
+    (tmp_path / "src" / "a").mkdir(parents=True)
+    assert watch.settle() == []
+    (tmp_path / "src" / "a" / "main.c").write_text("int main;")
+    assert watch.settle() == [("src/a/main.c", "int main;")]
+
+
+def test_reads_one_byte_past_the_limit(tmp_path: Path, changes: StartWatcher) -> None:
+    watch = changes({"big.bin": 4})
+    (tmp_path / "big.bin").write_bytes(b"\xff" + b"x" * 10)
+    assert watch.settle() == [("big.bin", "\udcffxxxx")]
+
+
+def test_writes_to_a_file_kept_open(tmp_path: Path, changes: StartWatcher) -> None:
+    watch = changes({"out.log": 100})
+    with open(tmp_path / "out.log", "w") as log:
+        log.write("step 1\n")
+        log.flush()
+        assert watch.settle() == [("out.log", "step 1\n")]
+        log.write("step 2\n")
+        log.flush()
+        assert watch.settle() == [("out.log", "step 1\nstep 2\n")]
+
+
+def test_file_written_with_its_new_directories(
+    tmp_path: Path, changes: StartWatcher
+) -> None:
+    watch = changes({"a/b/f": 100})
+    # Written before the watch on a/b can exist; the rescan on the new
+    # directory finds it
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "a" / "b" / "f").write_text("x")
+    assert watch.settle() == [("a/b/f", "x")]